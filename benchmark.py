@@ -0,0 +1,264 @@
+#! python3
+# benchmark.py
+
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import mlbsimulator
+
+#Column layout of the FanGraphs 'Standard' leaderboard exports
+BATTING_HEADERS = (
+    'Name', 'Team', 'G', 'AB', 'PA', 'H', '1B', '2B', '3B', 'HR', 'R', 'RBI',
+    'BB', 'IBB', 'SO', 'HBP', 'SF', 'SH', 'GDP', 'SB', 'CS', 'AVG',
+    'playerid')
+PITCHING_HEADERS = (
+    'Name', 'Team', 'W', 'L', 'ERA', 'G', 'GS', 'CG', 'ShO', 'SV', 'HLD',
+    'BS', 'IP', 'TBF', 'H', 'R', 'ER', 'HR', 'BB', 'IBB', 'HBP', 'WP', 'BK',
+    'SO', 'playerid')
+
+MODES = ('game', 'batch', 'exact')
+
+def batting_line(name, team, playerid, rng):
+    ''' A plausible Standard batting row around league-average rates
+'''
+    pa = rng.randint(50, 650)
+    bb = round(pa*rng.uniform(0.05, 0.12))
+    ibb = round(pa*rng.uniform(0, 0.01))
+    hbp = round(pa*rng.uniform(0.005, 0.015))
+    so = round(pa*rng.uniform(0.15, 0.30))
+    sf, sh = round(pa*0.007), round(pa*0.003)
+    ab = pa-bb-ibb-hbp-sf-sh
+    h = round(ab*rng.uniform(0.21, 0.30))
+    hr = round(h*rng.uniform(0.05, 0.22))
+    doubles = round(h*rng.uniform(0.15, 0.25))
+    triples = round(h*rng.uniform(0, 0.03))
+    singles = h-hr-doubles-triples
+    return [name, team, pa//4, ab, pa, h, singles, doubles, triples, hr,
+            round(pa*0.12), round(pa*0.11), bb, ibb, so, hbp, sf, sh,
+            round(pa*rng.uniform(0.01, 0.03)), round(pa*0.01),
+            round(pa*0.004), f'{h/ab:.3f}'.lstrip('0'), playerid]
+
+def pitching_line(name, team, playerid, rng, *, starter=True):
+    ''' A plausible Standard pitching row around league-average rates
+'''
+    tbf = rng.randint(400, 800) if starter else rng.randint(100, 300)
+    h = round(tbf*rng.uniform(0.19, 0.26))
+    bb = round(tbf*rng.uniform(0.05, 0.11))
+    ibb = round(tbf*rng.uniform(0, 0.008))
+    hbp = round(tbf*rng.uniform(0.005, 0.015))
+    so = round(tbf*rng.uniform(0.16, 0.32))
+    ip = (tbf-h-bb-ibb-hbp)/3
+    er = round(tbf*0.11)
+    games = tbf//24 if starter else tbf//4
+    return [name, team, games//3, games//3, f'{er*9/ip:.2f}', games,
+            games if starter else 0, 0, 0, 0 if starter else games//10,
+            0 if starter else games//5, 0, f'{ip:.1f}', tbf, h,
+            round(er*1.08), er, round(tbf*rng.uniform(0.02, 0.04)), bb, ibb,
+            hbp, round(tbf*0.008), 0, so, playerid]
+
+def write_fixtures(directory, *, batters=3, pitchers=6, seed=0):
+    ''' Write synthetic C.csv ... RP.csv leaderboards of every team
+
+Each team gets batters players at every batting position and pitchers
+starters and relievers, in the layout and encoding of the FanGraphs
+export, so Teams.compile_rosters reads them like the real files.
+'''
+    rng = random.Random(seed)
+    teams = mlbsimulator.Teams().teams
+    playerid = 0
+    for pos in list(mlbsimulator.BATTING)+list(mlbsimulator.PITCHING):
+        batting = pos in mlbsimulator.BATTING
+        path = os.path.join(directory, f'{pos}.csv')
+        with open(path, 'w', newline='', encoding='utf-8-sig') as file:
+            writer = csv.writer(file)
+            writer.writerow(BATTING_HEADERS if batting else PITCHING_HEADERS)
+            for team in teams:
+                for _ in range(batters if batting else pitchers):
+                    playerid += 1
+                    name = f'{pos} Player {playerid}'
+                    if batting:
+                        row = batting_line(name, team, playerid, rng)
+                    else:
+                        row = pitching_line(
+                            name, team, playerid, rng, starter=pos == 'SP')
+                    writer.writerow(row)
+
+def best_time(function, *args, repeat=3, **kwargs):
+    ''' Fastest of repeat calls, and the result of the last one
+'''
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter()-started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def load_rosters(directory, away_team, home_team):
+    teams = mlbsimulator.Teams(directory)
+    teams.away_team, teams.home_team = away_team, home_team
+    teams.compile_rosters()
+    return teams
+
+def bench_rosters(directory, away_team, home_team):
+    ''' Seconds to load a matchup's rosters without and with the cache
+'''
+    shutil.rmtree(
+        os.path.join(directory, mlbsimulator.CACHE_DIRECTORY),
+        ignore_errors=True)
+    cold, _ = best_time(
+        load_rosters, directory, away_team, home_team, repeat=1)
+    warm, _ = best_time(load_rosters, directory, away_team, home_team)
+    return {'cold_seconds': cold, 'warm_seconds': warm}
+
+def plate_appearances_per_game(simulation, games, seed):
+    ''' Average plate appearances per game, counted with a box score
+'''
+    counted = mlbsimulator.Simulation(
+        simulation.away, simulation.home,
+        simulation.away_roster, simulation.home_roster,
+        simulation.away_lineup, simulation.home_lineup,
+        simulation.away_pitcher, simulation.home_pitcher, box_score=True)
+    stats = mlbsimulator.run_chunk(counted, games, seed, summary=True)
+    batting = stats.box_score.batting
+    n = len(mlbsimulator.BATTING_STATS)
+    return sum(batting[0::n])/stats.box_score.games
+
+def run_mode(simulation, mode, games, seed):
+    if mode == 'exact':
+        return mlbsimulator.MarkovSolver.from_simulation(simulation).solve()
+    return mlbsimulator.run_chunk(simulation, games, seed, mode)
+
+def bench_mode(simulation, mode, games, seed, pa_per_game):
+    ''' Throughput and memory of one engine mode on a matchup
+'''
+    if mode == 'exact':
+        seconds, _ = best_time(run_mode, simulation, mode, games, seed)
+        return {'solves_per_second': 1/seconds, 'seconds': seconds}
+    seconds, _ = best_time(run_mode, simulation, mode, games, seed)
+    tracemalloc.start()
+    results = run_mode(simulation, mode, games, seed)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return {
+        'games': games,
+        'seconds': seconds,
+        'games_per_second': games/seconds,
+        'plate_appearances_per_second': games*pa_per_game/seconds,
+        'peak_bytes_per_game': peak/games,
+        'retained_bytes_per_game': retained/games}
+
+def bench_scaling(simulation, mode, games, seed, workers, directory):
+    ''' Games per second of run_parallel over each worker count
+'''
+    scaling = {}
+    for count in workers:
+        started = time.perf_counter()
+        if count == 1:
+            run_mode(simulation, mode, games, seed)
+        else:
+            mlbsimulator.run_parallel(
+                simulation, games, workers=count, seed=seed, mode=mode,
+                directory=directory)
+        seconds = time.perf_counter()-started
+        scaling[str(count)] = {'seconds': seconds,
+                               'games_per_second': games/seconds}
+    return scaling
+
+def environment():
+    ''' Versions the results depend on, to tell runs apart
+'''
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    numpy = mlbsimulator.np.__version__ if mlbsimulator.np is not None\
+            else None
+    return {'commit': commit, 'python': platform.python_version(),
+            'numpy': numpy, 'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+def run(directory=None, *, away_team='Angels', home_team='Astros',
+        modes=MODES, games=None, workers=(1, 2, 4), seed=0):
+    ''' Run every benchmark and return the results as a dict
+
+Without a directory the synthetic fixtures are written to a temporary
+one. games maps a mode to the games per measurement.
+'''
+    games = dict({'game': 2000, 'batch': 200000, 'exact': 1}, **(games or {}))
+    if directory is None:
+        with tempfile.TemporaryDirectory() as temporary:
+            write_fixtures(temporary, seed=seed)
+            return run(temporary, away_team=away_team, home_team=home_team,
+                       modes=modes, games=games, workers=workers, seed=seed)
+
+    started = time.perf_counter()
+    results = {'environment': environment(),
+               'rosters': bench_rosters(directory, away_team, home_team)}
+    import_time, roster_time = mlbsimulator.measure_startup(
+        away_team, home_team, directory)
+    results['startup'] = {'import_seconds': import_time,
+                          'roster_seconds': roster_time,
+                          'budget_seconds': mlbsimulator.STARTUP_BUDGET}
+    simulation = mlbsimulator.setup_simulation(
+        away_team, home_team, rng=random.Random(seed), directory=directory)
+    pa_per_game = plate_appearances_per_game(simulation, 500, seed)
+    results['plate_appearances_per_game'] = pa_per_game
+    results['modes'] = {}
+    for mode in modes:
+        if mode != 'game' and mlbsimulator.np is None:
+            continue
+        result = bench_mode(simulation, mode, games[mode], seed, pa_per_game)
+        if mode != 'exact':
+            result['scaling'] = bench_scaling(
+                simulation, mode, games[mode], seed, workers, directory)
+        results['modes'][mode] = result
+    results['seconds'] = time.perf_counter()-started
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='MLB simulator benchmarks')
+    parser.add_argument('--directory',
+                        help='leaderboard CSVs to use instead of synthetic '
+                        'fixtures')
+    parser.add_argument('--fixtures', metavar='DIRECTORY',
+                        help='only write the synthetic fixtures here')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--games', type=int,
+                        help='games per measurement in every mode')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark.json',
+                        help="JSON file to write, '-' for standard output")
+    args = parser.parse_args(argv)
+    if args.fixtures:
+        os.makedirs(args.fixtures, exist_ok=True)
+        write_fixtures(args.fixtures, seed=args.seed)
+        return
+    games = {'game': args.games, 'batch': args.games} if args.games else None
+    results = run(args.directory, modes=args.modes, games=games,
+                  workers=args.workers, seed=args.seed)
+    if args.output == '-':
+        json.dump(results, sys.stdout, indent=2)
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    return results
+
+if __name__ == '__main__':
+    main()
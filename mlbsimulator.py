@@ -1,21 +1,56 @@
 #! python3
 # mlb_simulator.py
 
+import array
+import bisect
+import collections
 import csv
+import functools
+import hashlib
+import importlib
+import importlib.util
+import io
+import itertools
+import json
 import logging
 import os
-import pprint
+import pickle
+import queue
 import random
-import shutil
 import sys
+import tempfile
 import time
 import threading
-import tkinter
 
-import bs4
-import requests
+class LazyModule:
+    ''' Stand-in for a module that is only imported when first used
 
-import fgexporter
+The first attribute lookup imports the module and rebinds its global
+name to it, so later lookups go straight to the module. Headless runs
+and worker processes never pay for the GUI, web or NumPy imports.
+'''
+    def __init__(self, name, alias=None):
+        self.name = name
+        self.alias = alias or name.partition('.')[0]
+
+    def __getattr__(self, attr):
+        importlib.import_module(self.name)
+        module = sys.modules[self.name.partition('.')[0]]
+        globals()[self.alias] = module
+        return getattr(module, attr)
+
+argparse = LazyModule('argparse')
+cProfile = LazyModule('cProfile')
+concurrent = LazyModule('concurrent.futures')
+subprocess = LazyModule('subprocess')
+urllib = LazyModule('urllib.parse')
+tkinter = LazyModule('tkinter')
+pstats = LazyModule('pstats')
+bs4 = LazyModule('bs4')
+requests = LazyModule('requests')
+#NumPy is optional: np is None when it is not installed
+np = LazyModule('numpy', 'np') if importlib.util.find_spec('numpy')\
+     else None
 
 logging.basicConfig(level=logging.DEBUG, format=' %(asctime)s - %(levelname)s - %(message)s')
 BATTING = {
@@ -51,13 +86,321 @@ TEAM_COLORS = (
     ("#fa4616", "#0c2340"), ("#d31145", "#002b5c"),
     ("#c4c3d4", "#27251f"), ("#ffffff", "#0c2340"))
 
+LEADERBOARD_URL = 'https://www.fangraphs.com/leaders.aspx'
+
+def leaderboard_query(configs, season=None):
+    ''' Query string of the leaderboard page of a BATTING/PITCHING config
+'''
+    if configs['Stats'] == 'Batting':
+        stats, position = 'bat', configs['Position']
+    else:
+        stats = {'Starters': 'sta', 'Relievers': 'rel'}[configs['Position']]
+        position = 'all'
+    query = {'pos': position, 'stats': stats, 'lg': 'all', 'qual': 0,
+             'type': 0, 'month': 0, 'ind': 0, 'team': 0, 'rost': 0,
+             'age': 0, 'players': 0, 'page': '1_10000'}
+    if season is not None:
+        query['season'] = query['season1'] = season
+    return query
+
+def parse_leaderboard(html):
+    ''' Headers and rows of the leaderboard table of a FanGraphs page
+
+The row number column is dropped and the playerid of each row is read
+from its player link, as in the CSV export.
+'''
+    soup = bs4.BeautifulSoup(html, 'html.parser')
+    table = soup.find('table', class_='rgMasterTable') or soup.find('table')
+    if table is None:
+        raise Exception('No leaderboard table in page')
+    header_cells = table.find_all('th', class_='rgHeader')\
+                   or table.find('thead').find_all('tr')[-1].find_all('th')
+    headers = [cell.get_text(strip=True) for cell in header_cells]
+    keep = [i for i, header in enumerate(headers) if header != '#']
+    rows = []
+    body = table.find('tbody') or table
+    for tr in body.find_all('tr'):
+        cells = tr.find_all('td')
+        if len(cells) != len(headers):
+            continue
+        link = tr.find('a', href=lambda href: href and 'playerid=' in href)
+        query = urllib.parse.urlsplit(link['href']).query if link else ''
+        playerid = urllib.parse.parse_qs(query).get('playerid', [''])[0]
+        rows.append([cells[i].get_text(strip=True) for i in keep]\
+                    +[playerid])
+    return [headers[i] for i in keep]+['playerid'], rows
+
+class LeaderboardFetcher:
+    ''' Download position leaderboards concurrently into {pos}.csv files
+
+The pages are fetched by a pool of threads sharing one requests.Session,
+whose connection pool is sized to the number of threads, so all eleven
+positions download at once over kept-alive connections. Every CSV is
+written to a temporary file and moved into place, so a reader never
+sees a partial file. done[pos] is a threading.Event set once the fetch
+of pos has finished, whether it succeeded or failed (errors[pos]).
+The session and threads are only created by the first fetch, and again
+by the first fetch after close.
+'''
+    def __init__(self, directory='', *, url=LEADERBOARD_URL, season=None,
+                 workers=len(BATTING)+len(PITCHING), timeout=30):
+        self.directory = directory
+        self.url, self.season = url, season
+        self.workers = workers
+        self.timeout = timeout
+        self.session = self.pool = None
+        self.done = {}
+        self.errors = {}
+
+    def start(self):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.pool = concurrent.futures.ThreadPoolExecutor(self.workers)
+
+    def fetch(self, positions=None, callback=None):
+        ''' Start fetching positions (all by default) and return at once
+
+callback(pos, error) is called from the fetching thread once each
+position is fetched, error being None on success, and before its event
+is set.
+'''
+        if positions is None:
+            positions = list(BATTING)+list(PITCHING)
+        if self.session is None:
+            self.start()
+        for pos in positions:
+            if self.fetching(pos):
+                continue
+            self.done[pos] = threading.Event()
+            self.errors.pop(pos, None)
+            self.pool.submit(self.fetch_position, pos, callback)
+        return [self.done[pos] for pos in positions]
+
+    def fetch_position(self, pos, callback=None):
+        error = None
+        try:
+            configs = BATTING.get(pos) or PITCHING.get(pos)
+            response = self.session.get(
+                self.url, params=leaderboard_query(configs, self.season),
+                timeout=self.timeout)
+            response.raise_for_status()
+            headers, rows = parse_leaderboard(response.text)
+            self.write_csv(pos, headers, rows)
+        except Exception as exception:
+            error = self.errors[pos] = exception
+            logging.debug(f'{pos} leaderboard not fetched: {exception}')
+        try:
+            if callback is not None:
+                callback(pos, error)
+        finally:
+            self.done[pos].set()
+
+    def write_csv(self, pos, headers, rows):
+        path = os.path.join(self.directory, f'{pos}.csv')
+        with open(f'{path}.tmp', 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(headers)
+            writer.writerows(rows)
+        os.replace(f'{path}.tmp', path)
+
+    def fetching(self, pos):
+        return pos in self.done and not self.done[pos].is_set()
+
+    def busy(self):
+        return any([not event.is_set() for event in self.done.values()])
+
+    def wait(self, positions=None, timeout=None):
+        ''' Block until positions (all started by default) are done
+'''
+        if positions is None:
+            positions = list(self.done)
+        deadline = None if timeout is None else time.monotonic()+timeout
+        for pos in positions:
+            remaining = None if deadline is None\
+                        else max(0, deadline-time.monotonic())
+            if not self.done[pos].wait(remaining):
+                return False
+        return True
+
+    def close(self):
+        if self.session is not None:
+            self.pool.shutdown(wait=False)
+            self.session.close()
+            self.session = self.pool = None
+
+HISTORY_DIRECTORY = '.rosterhistory'
+
+def file_hash(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+def read_rows(path):
+    ''' Headers and {key: row} of a leaderboard CSV, keyed by playerid (or
+by name and team if it has none)
+'''
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        reader = csv.reader(file)
+        headers = next(reader)
+        rows = {}
+        for row in reader:
+            rows[row_key(headers, row)] = row
+    return headers, rows
+
+def row_key(headers, row):
+    if 'playerid' in headers:
+        return row[headers.index('playerid')]
+    return f"{row[headers.index('Name')]}|{row[headers.index('Team')]}"
+
+class RefreshManager:
+    ''' Refresh the position leaderboards only when they are stale
+
+A manifest in HISTORY_DIRECTORY records when each {pos}.csv was fetched
+and the hash of its content. refresh skips files fetched less than
+max_age seconds ago and left untouched since. Whenever a fetch changes a
+file, the rows that were added or changed and the keys of the rows that
+disappeared are stored as a dated snapshot, so that any past version of
+the leaderboards can be rebuilt by restore without keeping full copies.
+'''
+    def __init__(self, directory='', *, max_age=24*60*60, fetcher=None):
+        self.directory = directory
+        self.max_age = max_age
+        self.fetcher = fetcher
+        self.history = os.path.join(directory, HISTORY_DIRECTORY)
+        self.manifest_path = os.path.join(self.history, 'manifest.json')
+        self.lock = threading.Lock()
+        try:
+            with open(self.manifest_path) as file:
+                self.manifest = json.load(file)
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    def path(self, pos):
+        return os.path.join(self.directory, f'{pos}.csv')
+
+    def stale(self, pos):
+        entry = self.manifest.get(pos)
+        if entry is None or not os.path.exists(self.path(pos)):
+            return True
+        if time.time()-entry['fetched'] > self.max_age:
+            return True
+        return file_hash(self.path(pos)) != entry['hash']
+
+    def refresh(self, positions=None, *, force=False, callback=None):
+        ''' Start fetching the stale positions (all by default)
+
+Returns the positions it started fetching, leaving out any whose fetch
+is still running; each is recorded once done, then callback(pos, error)
+is called as with LeaderboardFetcher.fetch.
+'''
+        if positions is None:
+            positions = list(BATTING)+list(PITCHING)
+        if self.fetcher is not None:
+            positions = [pos for pos in positions\
+                         if not self.fetcher.fetching(pos)]
+        stale = [pos for pos in positions if force or self.stale(pos)]
+        if stale:
+            if self.fetcher is None:
+                self.fetcher = LeaderboardFetcher(self.directory)
+            self.fetcher.fetch(
+                stale, callback=lambda pos, error: self.fetched(
+                    pos, error, callback))
+        return stale
+
+    def fetched(self, pos, error, callback=None):
+        if error is None:
+            self.record(pos)
+        if callback is not None:
+            callback(pos, error)
+
+    def record(self, pos, fetched=None):
+        ''' Record the current {pos}.csv, storing its changes as a snapshot
+'''
+        fetched = time.time() if fetched is None else fetched
+        content_hash = file_hash(self.path(pos))
+        with self.lock:
+            entry = self.manifest.setdefault(
+                pos, {'hash': None, 'snapshots': []})
+            entry['fetched'] = fetched
+            if content_hash != entry['hash']:
+                headers, rows = read_rows(self.path(pos))
+                old_headers, old_rows = self.snapshot(pos)
+                if headers != old_headers:
+                    old_rows = {}
+                stamp = time.strftime(
+                    '%Y-%m-%dT%H%M%S', time.gmtime(fetched))
+                while stamp in entry['snapshots']:
+                    stamp += '+'
+                os.makedirs(self.history, exist_ok=True)
+                with open(self.snapshot_path(pos, stamp), 'w') as file:
+                    json.dump({
+                        'headers': headers,
+                        'rows': {key: row for key, row in rows.items()\
+                                 if old_rows.get(key) != row},
+                        'removed': [key for key in old_rows\
+                                    if key not in rows]}, file)
+                entry['snapshots'].append(stamp)
+                entry['hash'] = content_hash
+            self.save()
+
+    def save(self):
+        os.makedirs(self.history, exist_ok=True)
+        with open(f'{self.manifest_path}.tmp', 'w') as file:
+            json.dump(self.manifest, file, indent=1)
+        os.replace(f'{self.manifest_path}.tmp', self.manifest_path)
+
+    def snapshot_path(self, pos, stamp):
+        return os.path.join(self.history, f'{pos}.{stamp}.json')
+
+    def snapshot(self, pos, as_of=None):
+        ''' Headers and {key: row} of pos as of a date or time (latest if
+None), e.g. '2021-06-01' or '2021-06-01T120000'
+'''
+        headers, rows = None, {}
+        for stamp in self.manifest.get(pos, {}).get('snapshots', []):
+            if as_of is not None and stamp[:len(as_of)] > as_of:
+                break
+            with open(self.snapshot_path(pos, stamp)) as file:
+                delta = json.load(file)
+            if delta['headers'] != headers:
+                headers, rows = delta['headers'], {}
+            for key in delta['removed']:
+                rows.pop(key, None)
+            rows.update(delta['rows'])
+        return headers, rows
+
+    def restore(self, as_of, directory=None):
+        ''' Write every position as of a date into a directory (by default
+HISTORY_DIRECTORY/as_of) and return it, ready for Teams or simulate
+'''
+        if directory is None:
+            directory = os.path.join(self.history, as_of)
+        os.makedirs(directory, exist_ok=True)
+        for pos in list(BATTING)+list(PITCHING):
+            headers, rows = self.snapshot(pos, as_of)
+            if headers is None:
+                raise Exception(f'No snapshot of {pos}.csv as of {as_of}')
+            with open(os.path.join(directory, f'{pos}.csv'), 'w',
+                      newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow(headers)
+                writer.writerows(rows.values())
+        return directory
+
+#Milliseconds between polls of a background job's results by a window
+POLL_MS = 100
+
 class ConfigureSimulationGUI:
     def __init__(self, teams):
         self.teams = teams
         self.root = tkinter.Tk()
         self.root.title('MLB Simulation - CONFIGURE SETTINGS')
-        self.update_threads = {}
-        self.leaderboards = fgexporter.Leaderboards()
+        self.fetcher = LeaderboardFetcher()
+        self.refresher = RefreshManager(fetcher=self.fetcher)
+        #(pos, error) of every finished fetch, put by the fetching threads
+        self.fetches = queue.Queue()
 
         #Option to update FanGraphs data
         self.update_batting = dict(zip(
@@ -72,6 +415,9 @@ class ConfigureSimulationGUI:
                 self.root, text=position, width=20,
                 command=lambda pos=position:self.update_file(pos))\
             for position in list(PITCHING)]))
+        self.update_all = tkinter.Button(
+            self.root, text='All', width=20,
+            command=lambda:self.update_file(*BATTING, *PITCHING))
         self.disabled = []
 
         #Select Away Team
@@ -120,6 +466,7 @@ class ConfigureSimulationGUI:
         ''' Grid all widgets to Tkinter window
 '''
         tkinter.Label(self.root, text='Update:').grid(row=0, column=0)
+        self.update_all.grid(row=0, column=3)
         tkinter.Label(self.root, text='Batting:').grid(row=1, column=0)
         for i, pos in enumerate(list(self.update_batting)):
             row, col = i//3+2, i%3+1
@@ -156,16 +503,21 @@ class ConfigureSimulationGUI:
         self.confirm_button.grid(row=13, column=0)
         self.notice.grid(row=13, column=1)
 
+        self.root.after(POLL_MS, self.drain_fetches)
         self.root.mainloop()
 
     def checkbox_callback(self, name, indx, mode):
+        ''' Keep at most one series length checked
+'''
         for var in self.mode_variables:
-            if self.mode_variables[var] == name:
+            if str(self.mode_variables[var]) == name:
                 setting = self.mode_variables[var].get()
         logging.debug(setting)
+        if not setting:
+            return
         for serie in self.mode_variables:
-            if self.mode_variables[serie] != name:
-                self.mode_variables[serie].set(not setting)
+            if str(self.mode_variables[serie]) != name:
+                self.mode_variables[serie].set(False)
 
     def color(self):
         ''' Set dropdown background to team colors
@@ -183,40 +535,49 @@ class ConfigureSimulationGUI:
         self.notice.config(text='', fg="black")
         self.continue_button.grid_forget()
 
-    def update_file(self, pos):
-        if pos in BATTING:
-            configs = BATTING.get(pos)
-        elif pos in PITCHING:
-            configs = PITCHING.get(pos)
-        thread = threading.Thread(target=self.export, args=(pos, configs,))
-        self.update_threads.setdefault(pos, thread)
-        thread.start()
-
-    def export(self, pos, configs):
-        self.disabled.append(pos)
-        for p in self.update_batting:
-            self.update_batting[p].config(state='disabled')
-        for p in self.update_pitching:
-            self.update_pitching[p].config(state='disabled')
-        self.leaderboards.config(
-            Stats=configs['Stats'], Position=configs['Position'],
-            Min=0, Type='Standard')
-        self.leaderboards.name = f'{pos}.csv'
-        self.leaderboards.webdriver.export()
-        while True:
-            if os.path.exists(os.path.join(os.getcwd(), f'{pos}.csv')):
-                status = tkinter.Label(
-                    self.root, text=f"'{pos}.csv' Done", fg='green')
-                status.grid(row=0, column=1)
-                break
-        for p in self.update_batting:
-            if p in self.disabled:
-                continue
-            self.update_batting[p].config(state='normal')
-        for p in self.update_pitching:
-            if p in self.disabled:
-                continue
-            self.update_pitching[p].config(state='normal')
+    def update_file(self, *positions):
+        ''' Fetch the leaderboards of positions in the background
+'''
+        #Positions already disabled are being or have been fetched
+        positions = [pos for pos in positions if pos not in self.disabled]
+        stale = self.refresher.refresh(
+            positions,
+            callback=lambda pos, error: self.fetches.put((pos, error)))
+        for pos in stale:
+            self.disabled.append(pos)
+            button = self.update_batting.get(pos)\
+                     or self.update_pitching.get(pos)
+            button.config(state='disabled')
+        for pos in positions:
+            if pos not in stale:
+                tkinter.Label(
+                    self.root, text=f"'{pos}.csv' Fresh", fg='green'
+                    ).grid(row=0, column=1)
+
+    def drain_fetches(self):
+        ''' Report the fetches finished since the last poll, then poll again
+
+Tkinter is not thread-safe, so the fetching threads only queue their
+results and this polls the queue from the Tkinter thread.
+'''
+        while not self.fetches.empty():
+            self.fetched(*self.fetches.get_nowait())
+        self.root.after(POLL_MS, self.drain_fetches)
+
+    def fetched(self, pos, error):
+        ''' Report a finished fetch, run on the Tkinter thread
+'''
+        if error is None:
+            status = tkinter.Label(
+                self.root, text=f"'{pos}.csv' Done", fg='green')
+        else:
+            status = tkinter.Label(
+                self.root, text=f"'{pos}.csv' Failed", fg='red')
+            self.disabled.remove(pos)
+            button = self.update_batting.get(pos)\
+                     or self.update_pitching.get(pos)
+            button.config(state='normal')
+        status.grid(row=0, column=1)
 
     def random_teams(self, *, away=False, home=False):
         if away:
@@ -235,7 +596,7 @@ class ConfigureSimulationGUI:
                 self.notice.config(text=f'Missing File: {pos}.csv', fg="red")
                 return
         #Assert that not file updates are in progress
-        if any([t.is_alive() for t in self.update_threads.values()]):
+        if self.fetcher.busy():
             self.notice.config(text='Incomplete Updates', fg="red")
             return
         #Assert that selected teams are not defaults
@@ -247,11 +608,16 @@ class ConfigureSimulationGUI:
         if self.away_variable.get() == self.home_variable.get():
             self.notice.config(text='Invalid Entry', fg="red")
             return
-        #Set teams
+        #Set teams and series length (1 for single games)
         self.away_team = self.away_variable.get()
         self.home_team = self.home_variable.get()
+        self.series = 1
+        for serie in self.mode_variables:
+            if self.mode_variables[serie].get():
+                self.series = int(serie.split('-')[0])
         #Lock file update options
-        threading.Thread(target=self.leaderboards.webdriver.quit).start()
+        self.fetcher.close()
+        self.update_all.config(state='disabled')
         for button in self.update_batting.values():
             button.config(state='disabled')
         for button in self.update_pitching.values():
@@ -260,8 +626,206 @@ class ConfigureSimulationGUI:
         self.notice.config(text='Submitted', fg="green")
         self.continue_button.grid(row=13, column=0)
 
+#Binary copies of the position CSVs, kept in this subdirectory of their folder
+CACHE_DIRECTORY = '.rostercache'
+#What reading a missing, stale or half written cache file can raise
+CACHE_ERRORS = (OSError, EOFError, KeyError, ValueError, IndexError,
+                pickle.UnpicklingError)
+
+def number(item):
+    return float(item) if item else 0.0
+
+#Columns kept from the BATTING and PITCHING leaderboards, with the
+#converter of their cells; every other column is dropped when parsing
+BATTING_SCHEMA = {
+    'Name': str, 'Team': str, 'PA': number, 'H': number, '1B': number,
+    '2B': number, '3B': number, 'HR': number, 'BB': number, 'IBB': number,
+    'HBP': number, 'SO': number, 'GDP': number}
+PITCHING_SCHEMA = {
+    'Name': str, 'Team': str, 'TBF': number, 'H': number, 'BB': number,
+    'IBB': number, 'HBP': number, 'SO': number}
+
+def parse_line(line):
+    return next(csv.reader([line.decode('utf-8-sig')]))
+
+def index_lines(path):
+    ''' Stream a leaderboard CSV once, mapping each team to its rows' offsets
+'''
+    lines = {}
+    with open(path, 'rb') as csvfile:
+        header = csvfile.readline()
+        headers = parse_line(header)
+        team = headers.index('Team')
+        offset = len(header)
+        for line in iter(csvfile.readline, b''):
+            row = parse_line(line)
+            if len(row) > team:
+                lines.setdefault(row[team], []).append(offset)
+            offset += len(line)
+    return headers, lines
+
+class Leaderboard:
+    ''' Rows of a FanGraphs leaderboard stored column by column
+
+Only the columns of a schema are kept: number columns as array('d') and
+str columns as lists.
+'''
+    def __init__(self, headers, columns):
+        self.headers = headers
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, schema, source_headers, rows):
+        indices = [source_headers.index(column) for column in schema]
+        converters = list(schema.values())
+        columns = [array.array('d') if converter is number else []\
+                   for converter in converters]
+        for row in rows:
+            for column, converter, i in zip(columns, converters, indices):
+                column.append(converter(row[i]))
+        return cls(list(schema), columns)
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def players(self):
+        ''' Yield the stat line of every row
+'''
+        for i in range(len(self)):
+            yield dict(zip(
+                self.headers, [column[i] for column in self.columns]))
+
+class LeaderboardFile:
+    ''' A leaderboard CSV indexed by team
+
+The cache file holds one pickled Leaderboard block per team followed by
+an index of the blocks' offsets, keyed by the CSV's absolute path,
+modification time and size. Loading some teams only reads their blocks.
+If the cache is stale it is rebuilt one team at a time from the byte
+offsets of each team's rows, so the whole CSV is never held in memory.
+
+Processes sharing the cache each build it in their own temporary file
+and swap it in whole, and a block that cannot be read from the cache is
+parsed from the CSV instead.
+'''
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self.headers = list(schema)
+        stat = os.stat(path)
+        self.key = (
+            os.path.abspath(path), stat.st_mtime_ns, stat.st_size,
+            tuple(schema))
+        self.cache_path = os.path.join(
+            os.path.dirname(path), CACHE_DIRECTORY,
+            f'{os.path.basename(path)}.blocks')
+        self.lines = None
+        self.blocks = self.read_index()
+        if self.blocks is None:
+            self.build()
+
+    def read_index(self):
+        try:
+            with open(self.cache_path, 'rb') as cache:
+                return self.load_index(cache)
+        except CACHE_ERRORS:
+            return None
+
+    def load_index(self, cache):
+        ''' Block offsets of an open cache file, None if it is stale
+'''
+        cache.seek(int.from_bytes(cache.read(8), 'big'))
+        index = pickle.load(cache)
+        return index['blocks'] if index['key'] == self.key else None
+
+    def build(self):
+        self.source_headers, self.lines = index_lines(self.path)
+        for column in self.schema:
+            if column not in self.source_headers:
+                raise Exception(f"Missing column '{column}' in {self.path}")
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            handle, temporary = tempfile.mkstemp(
+                suffix='.tmp', dir=os.path.dirname(self.cache_path))
+        except OSError as error:
+            logging.debug(f'Roster cache not written: {error}')
+            return
+        try:
+            blocks = {}
+            with os.fdopen(handle, 'wb') as cache:
+                cache.write(bytes(8))
+                for team in self.lines:
+                    blocks[team] = cache.tell()
+                    pickle.dump(
+                        self.parse_team(team).columns, cache,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+                position = cache.tell()
+                pickle.dump({'key': self.key, 'blocks': blocks},
+                    cache, protocol=pickle.HIGHEST_PROTOCOL)
+                cache.seek(0)
+                cache.write(position.to_bytes(8, 'big'))
+            os.replace(temporary, self.cache_path)
+            self.blocks = blocks
+        except OSError as error:
+            logging.debug(f'Roster cache not written: {error}')
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    @property
+    def teams(self):
+        return list(self.blocks if self.blocks is not None else self.lines)
+
+    def parse_team(self, team):
+        if self.lines is None:
+            self.source_headers, self.lines = index_lines(self.path)
+        with open(self.path, 'rb') as csvfile:
+            rows = []
+            for offset in self.lines.get(team, []):
+                csvfile.seek(offset)
+                rows.append(parse_line(csvfile.readline()))
+        return Leaderboard.from_rows(self.schema, self.source_headers, rows)
+
+    def players(self, teams):
+        ''' Yield the stat line of every player on one of the teams
+'''
+        cache = blocks = None
+        if self.blocks is not None:
+            #Another process may have replaced the cache since read_index,
+            #so the offsets are read again from the file being read
+            try:
+                cache = open(self.cache_path, 'rb')
+                blocks = self.load_index(cache)
+            except CACHE_ERRORS as error:
+                logging.debug(f'Roster cache not read: {error}')
+        try:
+            for team in teams:
+                columns = None
+                if blocks is not None:
+                    if team not in blocks:
+                        continue
+                    try:
+                        cache.seek(blocks[team])
+                        columns = pickle.load(cache)
+                    except CACHE_ERRORS as error:
+                        logging.debug(f'{team} not read from the roster '
+                                      f'cache: {error}')
+                if columns is None:
+                    yield from self.parse_team(team).players()
+                else:
+                    yield from Leaderboard(self.headers, columns).players()
+        finally:
+            if cache is not None:
+                cache.close()
+
+def load_leaderboard(path, schema):
+    ''' Open a leaderboard CSV through its team-indexed cache
+'''
+    return LeaderboardFile(path, schema)
+
 class Teams:
-    def __init__(self):
+    def __init__(self, directory=''):
+        self.directory = directory
         self.teams = [
             'Angels', 'Astros', 'Athletics', 'Blue Jays', 'Braves', 'Brewers',
             'Cardinals', 'Cubs', 'Diamondbacks', 'Dodgers', 'Giants',
@@ -281,20 +845,13 @@ class Teams:
         for position in list(BATTING)+list(PITCHING):
             self.away_depth_chart.setdefault(position, {})
             self.home_depth_chart.setdefault(position, {})
-            with open(f'{position}.csv', encoding='utf-8-sig') as csvfile:
-                data = list(csv.reader(csvfile))
-            headers = data.pop(0)
-            for row in data:
-                if row[1] not in (self.away_team, self.home_team):
-                    continue
-                for i, item in enumerate(row):
-                    try:
-                        row[i] = float(item)
-                    except ValueError:
-                        if item.endswith('%'):
-                            row[i] = round(float(item.strip('%'))/100, 3)
-                player_data = dict(zip(headers, row))
-                name, team = row[0], row[1]
+            path = os.path.join(self.directory, f'{position}.csv')
+            schema = BATTING_SCHEMA if position in BATTING\
+                     else PITCHING_SCHEMA
+            leaderboard = load_leaderboard(path, schema)
+            for player_data in leaderboard.players(
+                (self.away_team, self.home_team)):
+                name, team = player_data['Name'], player_data['Team']
                 if team == self.away_team:
                     self.away_depth_chart[position].setdefault(
                         name, player_data)
@@ -304,6 +861,57 @@ class Teams:
                         name, player_data)
                     self.home_roster.setdefault(name, player_data)
 
+def random_lineup(depth_chart, rng=random):
+    ''' Select a starter at each position weighted by PA, in a shuffled order
+'''
+    lineup = {}
+    for pos in BATTING:
+        pos_data = depth_chart.get(pos)
+        players = [item for item in pos_data\
+                   if item not in lineup]
+        player_pa = [pos_data[p].get('PA') for p in pos_data]
+        total_pa = sum(player_pa)
+
+        start_probs = [p_pa/total_pa for p_pa in player_pa]
+        starter = rng.choices(
+            list(players),
+            weights=start_probs)[0]
+        existing_starters = list(lineup.values())
+        while starter in existing_starters:
+            del start_probs[players.index(starter)]
+            players.remove(starter)
+            if not players:
+                raise Exception(
+                    "Impossible lineup permutation")
+            starter = rng.choices(
+                list(players),
+                weights=start_probs)[0]
+        lineup.setdefault(pos, starter)
+    ordered = list(lineup.items())
+    rng.shuffle(ordered)
+    return dict(ordered)
+
+def random_sp(depth_chart, rng=random):
+    ''' Select a starting pitcher weighted by TBF
+'''
+    starting_pitchers = depth_chart.get('SP')
+    pitchers, pitcher_tbf = [], []
+    for player in starting_pitchers:
+        tbf = starting_pitchers[player].get('TBF')
+        if tbf is not None:
+            pitchers.append(player)
+            pitcher_tbf.append(tbf)
+    total_tbf = sum(pitcher_tbf)
+    start_probs = [p_tbf/total_tbf for p_tbf in pitcher_tbf]
+    return rng.choices(
+        list(pitchers),
+        weights=start_probs)[0]
+
+def batting_order(lineup):
+    ''' Convert a {position: player} lineup into a {spot: player} lineup
+'''
+    return dict(enumerate(lineup.values(), 1))
+
 class ConfigureLineupsGUI:
     def __init__(self, teams, away_team, home_team, away_roster, home_roster,
                  away_depth_chart, home_depth_chart):
@@ -328,6 +936,11 @@ class ConfigureLineupsGUI:
         self.reps['Entry']['textvariable'] = self.reps['Variable']
         self.more_reps = tkinter.Button(
             self.root, text='+', command=lambda:self.adjust_reps('+'))
+        #A target precision replaces the reps by simulate_to_precision
+        self.precision = {
+            'Variable': tkinter.StringVar(self.root, value=''),
+            'Entry': tkinter.Entry(self.root)}
+        self.precision['Entry']['textvariable'] = self.precision['Variable']
 
         self.rand_away_lineup = tkinter.Button(
             self.root, text='Random',
@@ -335,6 +948,19 @@ class ConfigureLineupsGUI:
         self.rand_home_lineup = tkinter.Button(
             self.root, text='Random',
             command=lambda:self.random_lineup(home=True))
+        self.optimize_away_lineup = tkinter.Button(
+            self.root, text='Optimize',
+            command=lambda:self.optimize_lineup(away=True))
+        self.optimize_home_lineup = tkinter.Button(
+            self.root, text='Optimize',
+            command=lambda:self.optimize_lineup(home=True))
+        #The optimizer runs on a worker thread and puts (away, best,
+        #error) on optimized once done
+        self.optimizer = None
+        self.optimized = queue.Queue()
+        self.stop_optimizer = tkinter.Button(
+            self.root, text='Stop', command=self.stop_optimizing)
+        self.optimize_status = tkinter.Label(self.root, text='')
         self.rand_away_sp = tkinter.Button(
             self.root, text='Random',
             command=lambda:self.random_sp(away=True))
@@ -380,6 +1006,9 @@ class ConfigureLineupsGUI:
         self.less_reps.grid(row=0, column=11)
         self.reps['Entry'].grid(row=0, column=12)
         self.more_reps.grid(row=0, column=13)
+        tkinter.Label(self.root, text='Or win % +/-:').grid(
+            row=1, column=10)
+        self.precision['Entry'].grid(row=1, column=12)
 
         tkinter.Label(self.root, text='Lineup').grid(row=1, column=0)
         tkinter.Label(self.root, text='Set Order', anchor='w').grid(
@@ -393,7 +1022,8 @@ class ConfigureLineupsGUI:
         tkinter.Label(self.root, text='Set Starters', anchor='w').grid(
             row=1, column=7)
         self.rand_home_lineup.grid(row=1, column=8)
-
+        self.optimize_away_lineup.grid(row=2, column=3)
+        self.optimize_home_lineup.grid(row=2, column=8)
 
         tkinter.Label(self.root, text='Pitching').grid(row=13, column=0)
         tkinter.Label(self.root, text='Set Pitcher', anchor='w').grid(
@@ -429,6 +1059,12 @@ class ConfigureLineupsGUI:
         if any([home_players.count(item) > 1 for item in home_players])\
            or '--Select--' in home_players:
             passed = False
+        precision = self.precision['Variable'].get().strip()
+        if precision:
+            try:
+                passed = passed and 0 < float(precision) < 50
+            except ValueError:
+                passed = False
         if not passed:
             self.notice.grid(row=15, column=1)
             return
@@ -531,32 +1167,7 @@ class ConfigureLineupsGUI:
     def random_lineup(self, away=False, home=False):
         assert away is not home
         depth_chart = self.away_depth_chart if away else self.home_depth_chart
-        lineup = {}
-        for pos in BATTING:
-            pos_data = depth_chart.get(pos)
-            players = [item for item in pos_data\
-                       if item not in lineup]
-            player_pa = [pos_data[p].get('PA') for p in pos_data]
-            total_pa = sum(player_pa)
-
-            start_probs = [p_pa/total_pa for p_pa in player_pa]
-            starter = random.choices(
-                list(players),
-                weights=start_probs)[0]
-            existing_starters = list(lineup.values())
-            while starter in existing_starters:
-                del start_probs[players.index(starter)]
-                players.remove(starter)
-                if not players:
-                    raise Exception(
-                        "Impossible lineup permutation")
-                starter = random.choices(
-                    list(players),
-                    weights=start_probs)[0]
-            lineup.setdefault(pos, starter)
-        ordered = list(lineup.items())
-        random.shuffle(ordered)
-        lineup = dict(ordered)
+        lineup = random_lineup(depth_chart)
         for i, (pos, starter) in enumerate(lineup.items(), 1):
             if away and not home:
                 self.away_batting_order[i]['Variable'].set(pos)
@@ -569,192 +1180,254 @@ class ConfigureLineupsGUI:
         self.update_options()
         self.continue_button.grid_forget()
 
+    def optimize_lineup(self, away=False, home=False):
+        ''' Reorder a lineup's starters by BattingOrderOptimizer
+
+Needs every starter of both teams and both starting pitchers set.
+'''
+        assert away is not home
+        lineups = []
+        for batting_order, starters in (
+            (self.away_batting_order, self.away_starters),
+            (self.home_batting_order, self.home_starters)):
+            lineups.append({spot: starters[batting_order[spot][
+                'Variable'].get()]['Variable'].get()\
+                            for spot in batting_order})
+        away_sp = self.away_pitchers['Variable'].get()
+        home_sp = self.home_pitchers['Variable'].get()
+        players = list(lineups[0].values())+list(lineups[1].values())
+        if '--Select--' in players+[away_sp, home_sp]\
+           or any([len(set(lineup.values())) < 9 for lineup in lineups]):
+            self.notice.grid(row=15, column=1)
+            return
+        if self.optimizer is not None:
+            return
+        simulation = Simulation(
+            self.away_team, self.home_team,
+            self.away_roster, self.home_roster,
+            lineups[0], lineups[1], away_sp, home_sp)
+        self.optimizer = BattingOrderOptimizer(simulation, away=away)
+        self.optimize_away_lineup.config(state='disabled')
+        self.optimize_home_lineup.config(state='disabled')
+        self.stop_optimizer.grid(row=2, column=4)
+        self.optimize_status.config(text='Optimizing...', fg='black')
+        self.optimize_status.grid(row=2, column=10, columnspan=3)
+        threading.Thread(
+            target=self.run_optimizer, args=(self.optimizer, away),
+            daemon=True).start()
+        self.root.after(POLL_MS, self.drain_optimizer)
+
+    def run_optimizer(self, optimizer, away):
+        ''' Search for the best order (optimizer thread)
+'''
+        try:
+            self.optimized.put((away, optimizer.optimize(top=1)[0], None))
+        except Exception as error:
+            self.optimized.put((away, None, error))
+
+    def stop_optimizing(self):
+        if self.optimizer is not None:
+            self.optimizer.stop()
+            self.optimize_status.config(text='Stopping...')
+
+    def drain_optimizer(self):
+        ''' Show the optimizer's progress until it is done, then apply the
+order it found (Tkinter thread)
+'''
+        try:
+            away, best, error = self.optimized.get_nowait()
+        except queue.Empty:
+            if not self.optimizer.stopped.is_set():
+                self.optimize_status.config(
+                    text=f'Optimizing... step {self.optimizer.steps}')
+            self.root.after(POLL_MS, self.drain_optimizer)
+            return
+        self.optimizer = None
+        self.optimize_away_lineup.config(state='normal')
+        self.optimize_home_lineup.config(state='normal')
+        self.stop_optimizer.grid_forget()
+        if error is not None:
+            logging.debug(f'Batting order not optimized: {error}')
+            self.optimize_status.config(text='Optimize failed', fg='red')
+            return
+        self.optimize_status.config(
+            text=f'{best.runs:.2f} runs per game', fg='green')
+        batting_order = self.away_batting_order if away\
+                        else self.home_batting_order
+        starters = self.away_starters if away else self.home_starters
+        positions = {starters[pos]['Variable'].get(): pos\
+                     for pos in starters}
+        for spot, player in best.lineup.items():
+            batting_order[spot]['Variable'].set(positions[player])
+            batting_order[spot]['History'][-1] = positions[player]
+        self.update_options()
+        self.continue_button.grid_forget()
+
     def random_sp(self, away=False, home=False):
         assert away is not home
         depth_chart = self.away_depth_chart if away\
                       else self.home_depth_chart
-        starting_pitchers = depth_chart.get('SP')
-        pitchers, pitcher_tbf = [], []
-        for i, player in enumerate(list(starting_pitchers)):
-            tbf = starting_pitchers[player].get('TBF')
-            if tbf is not None:
-                pitchers.append(player)
-                pitcher_tbf.append(tbf)
-        total_tbf = sum(pitcher_tbf)
-        start_probs = [p_tbf/total_tbf for p_tbf in pitcher_tbf]
-        pitcher = random.choices(
-            list(pitchers),
-            weights=start_probs)[0]
+        pitcher = random_sp(depth_chart)
         if away and not home:
             self.away_pitchers['Variable'].set(pitcher)
         elif home and not away:
             self.home_pitchers['Variable'].set(pitcher)
         self.continue_button.grid_forget()
 
-class Game:
-    def __init__(self, away_team, home_team, away_roster, home_roster,
-                 away_depth_chart, home_depth_chart,
-                 away_lineup, home_lineup, away_sp, home_sp):
-        self.away, self.home = away_team, home_team
-        self.away_roster, self.home_roster = away_roster, home_roster
-        self.away_depth_chart = away_depth_chart
-        self.home_depth_chart = home_depth_chart
-
-        self.away_lineup, self.home_lineup = away_lineup, home_lineup
-        self.away_pitcher, self.home_pitcher = away_sp, home_sp
-        self.away_index, self.home_index = 1, 1
-        self.away_score, self.home_score = 0, 0
-        self.top, self.bottom = False, False
-        self.inning = 1
-        self.gameover = True
+STRIKEOUTS = ('Swinging', 'Looking', 'Foul Tip')
+STRIKEOUT_WEIGHTS = tuple(itertools.accumulate((0.70, 0.25, 0.05)))
+OUTS = ('Groundout', 'Flyout', 'Lineout', 'Popout')
+OUT_WEIGHTS = tuple(itertools.accumulate((0.55, 0.25, 0.10, 0.10)))
 
-        self.away_box_score = {'Lineup': {}, 'Pitchers': {}}
-        self.home_box_score = {'Lineup': {}, 'Pitchers': {}}
+#Events that move runners differently, in the order of Matchup.events
+EVENTS = (
+    'Strikeout', 'Walk', 'Single', 'Single (extra base)', 'Double',
+    'Double (extra base)', 'Triple', 'Home Run', 'Double Play',
+    'Groundout', 'Flyout', 'Lineout')
 
-        self.bases = {1: '', 2: '', 3: '', 4: []}
+def advance(event, bases, outs):
+    ''' Apply an event to a base state (bit 0 = 1B, 1 = 2B, 2 = 3B)
 
-        innings = list(range(1, 10)) if self.inning <= 9\
-                  else list(range(1, self.inning+1))
-        categories = ['R', 'H', 'E']
+Returns the new base state, the runs scored, the outs after the play and
+where the batter and the runners on first, second and third end up
+(1-3 for a base, 4 for home, 0 for out or no runner). Runs scored on the
+third out do not count and the bases are cleared.
+'''
+    first = bases & 1
+    outs_made = 0
+    if event == 'Strikeout' or event == 'Lineout':
+        outs_made, moves = 1, [0, 1, 2, 3]
+    elif event == 'Walk':
+        second = bases>>1 & 1
+        moves = [1, 2, 3 if first else 2, 4 if first and second else 3]
+    elif event == 'Single':
+        moves = [1, 2, 3, 4]
+    elif event == 'Single (extra base)':
+        moves = [1, 3, 4, 4]
+    elif event == 'Double':
+        moves = [2, 3, 4, 4]
+    elif event == 'Double (extra base)':
+        moves = [2, 4, 4, 4]
+    elif event == 'Triple':
+        moves = [3, 4, 4, 4]
+    elif event == 'Home Run':
+        moves = [4, 4, 4, 4]
+    elif event == 'Double Play' and first and outs < 2:
+        outs_made, moves = 2, [0, 0, 3, 4]
+    elif event == 'Groundout' or event == 'Double Play':
+        outs_made, moves = 1, [0, 2, 3, 4] if first else [0, 1, 2, 4]
+    elif event == 'Flyout':
+        outs_made, moves = 1, [0, 1, 3, 4] if outs < 2 else [0, 1, 2, 3]
+    for base in (1, 2, 3):
+        if not bases>>(base-1) & 1:
+            moves[base] = 0
+    outs += outs_made
+    if outs >= 3:
+        return 0, 0, 3, (0, 0, 0, 0)
+    new_bases = 0
+    for dest in moves:
+        if 1 <= dest <= 3:
+            new_bases |= 1<<(dest-1)
+    return new_bases, moves.count(4), outs, tuple(moves)
 
-        self.root = tkinter.Tk()
-        self.ls_labels = {
-            'Head': [tkinter.StringVar(self.root, value='')],
-            'Body': [tkinter.StringVar(self.root, value=i)\
-                     for i in innings],
-            'Tail': [tkinter.StringVar(self.root, value=c)\
-                     for c in categories]}
-        self.ls_away = {
-            'Head': [tkinter.StringVar(self.root, value=self.away)],
-            'Body': [tkinter.StringVar(self.root, value='')\
-                     for i in innings],
-            'Tail': [tkinter.StringVar(self.root, value='0')\
-                     for c in categories]}
-        self.ls_home = {
-            'Head': [tkinter.StringVar(self.root, value=self.home)],
-            'Body': [tkinter.StringVar(self.root, value='')\
-                     for i in innings],
-            'Tail': [tkinter.StringVar(self.root, value='0')\
-                     for c in categories]}
-        self.line_score = [self.ls_labels, self.ls_away, self.ls_home]
-        self.display()
+#ADVANCES[event][outs][bases] = (bases, runs, outs, moves)
+ADVANCES = tuple(
+    tuple(tuple(advance(event, bases, outs) for bases in range(8))\
+          for outs in range(3))\
+    for event in EVENTS)
+#TRANSITIONS[event][outs][bases] = (bases, runs, outs)
+TRANSITIONS = tuple(
+    tuple(tuple(state[:3] for state in row) for row in table)\
+    for table in ADVANCES)
 
-    def display(self):
-        for r, row in enumerate(self.line_score):
-            values = []
-            values.extend(list(row.values())[0])
-            values.extend(list(row.values())[1])
-            values.extend(list(row.values())[2])
-            for c, item in enumerate(values):
-                w = 30 if item in row['Head'] else 10
-                tkinter.Label(
-                    self.root, textvariable=item, relief="sunken",
-                    width=w
-                    ).grid(row=r, column=c)
-        threading.Thread(target=self.simulate_game).start()
-        self.root.mainloop()
+(STRIKEOUT, WALK, SINGLE, SINGLE_EXTRA, DOUBLE, DOUBLE_EXTRA, TRIPLE,
+ HOME_RUN, DOUBLE_PLAY, GROUNDOUT, FLYOUT, LINEOUT) = range(len(EVENTS))
+#Events from worst to best for the batting team
+EVENT_ORDER = (
+    DOUBLE_PLAY, STRIKEOUT, GROUNDOUT, LINEOUT, FLYOUT, WALK, SINGLE,
+    SINGLE_EXTRA, DOUBLE, DOUBLE_EXTRA, TRIPLE, HOME_RUN)
+#Bases whose runners are listed as scoring in this order, lead runner
+#first except on a single with an extra base, which has always listed
+#the runner from second before the one from third
+SCORER_ORDER = tuple(
+    (2, 3, 1, 0) if event == SINGLE_EXTRA else (3, 2, 1, 0)\
+    for event in range(len(EVENTS)))
 
-    def simulate_game(self, *, xrunner=True):
-        while self.inning <= 9 or self.away_score == self.home_score:
-            self.simulate_inning(xrunner)
-            self.inning += 1
-        tkinter.Button(
-            self.root, text="Continue", command=self.root.destroy
-            ).grid(row=3, column=0)
+PLAY_BY_PLAY = {
+    'Swinging': 'strikes out swinging.',
+    'Looking': 'strikes out looking.',
+    'Foul Tip': 'strikes out on a foul tip.',
+    'BB': 'walks.',
+    'IBB': 'intentionally walks.',
+    'HBP': 'hit by pitch.',
+    '1B': 'singles.',
+    '2B': 'doubles.',
+    '3B': 'triples.',
+    'HR': 'homers.',
+    'Double Play': 'grounds into a double play.',
+    'Groundout': 'grounds out.',
+    'Flyout': 'flies out.',
+    'Lineout': 'lines out.',
+    'Popout': 'pops out.'}
 
-    def simulate_inning(self, xrunner):
-        self.ls_away['Body'][self.inning-1].set(0)
-        self.ls_home['Body'][self.inning-1].set(0)
+class Matchup:
+    ''' Outcome probabilities of one batter facing one pitcher
 
-        if xrunner and self.inning > 9:
-            self.bases[2] = self.away_lineup.get(self.away_index)
-            print(f'{self.bases[2]} starting at second.')
-        self.outs = 0
-        self.top, self.bottom = True, False
-        while self.outs < 3:
-            self.away_index = 1 if self.away_index == 9\
-                              else self.away_index+1
-            self.batter = self.away_lineup.get(self.away_index)
-            self.pitcher = self.away_pitcher
-            self.batter_data = self.away_roster.get(self.batter)
-            self.pitcher_data = self.away_roster.get(self.pitcher)
-            self.plate_appearance()
-            if self.outs == 3:
-                self.bases = dict(zip(list(self.bases), (
-                    '', '', '', [])))
-            runs_scored, self.bases[4] = self.bases[4], []
-            for runner in runs_scored:
-                if runner:
-                    self.ls_away['Body'][self.inning-1].set(
-                        int(self.ls_away['Body'][self.inning-1].get())+1)
-                    self.ls_away['Tail'][0].set(
-                        int(self.ls_away['Tail'][0].get())+1)
-                    self.away_score += 1
-                    print(f'{runner} scored.', end='\t')
-            print()
-            print(f'1B: {self.bases[1]}'.ljust(25), end='')
-            print(f'2B: {self.bases[2]}'.ljust(25), end='')
-            print(f'3B: {self.bases[3]}'.ljust(25), end='')
-            print(f'{self.outs} outs')
-            print()
+The strikeout, walk, hit and out rates and their splits are flattened
+into events, the probability of every entry of EVENTS that BatchSimulation
+and MarkovSolver work from, and into the (event, play) pairs that
+Simulation draws: plays, an AliasSampler of them, and ordered_plays, a
+CumulativeSampler of them from worst to best for the batter. The table
+only depends on the two players' stat lines, so it is built once and
+reused for every rep.
+'''
+    walks = ('BB', 'IBB', 'HBP')
+    hits = ('1B', '2B', '3B', 'HR')
 
-        if self.inning >= 9 and self.home_score > self.away_score:
-            self.ls_home['Body'][self.inning-1].set('X')
-            return
+    def __init__(self, batter_data, pitcher_data):
+        self.batter_data, self.pitcher_data = batter_data, pitcher_data
+        p_strikeout = self.outcome_probability(['SO'], ['SO'])
+        p_walks = [self.outcome_probability([stat], [stat])\
+                   for stat in self.walks]
+        p_hit = self.outcome_probability(['H'], ['H'])
+        p_walk = sum(p_walks)
+        p_out = 1-p_strikeout-p_walk-p_hit
+        #GDP per PA, as a share of all outs
+        self.gdp = min(1, batter_data['GDP']/batter_data['PA']/p_out)
 
-        if xrunner and self.inning > 9:
-            self.bases[2] = self.home_lineup.get(self.home_index)
-            print(f'{self.bases[2]} starting at second.')
-        self.outs = 0
-        self.top, self.bottom = False, True
-        while self.outs < 3:
-            self.home_index = 1 if self.home_index == 9\
-                              else self.home_index+1
-            self.batter = self.home_lineup.get(self.home_index)
-            self.pitcher = self.home_pitcher
-            self.batter_data = self.home_roster.get(self.batter)
-            self.pitcher_data = self.home_roster.get(self.pitcher)
-            self.plate_appearance()
-            if self.outs == 3:
-                self.bases = dict(zip(list(self.bases), (
-                    '', '', '', [])))
-            runs_scored, self.bases[4] = self.bases[4], []
-            for runner in runs_scored:
-                if runner:
-                    self.ls_home['Body'][self.inning-1].set(
-                        int(self.ls_home['Body'][self.inning-1].get())+1)
-                    self.ls_home['Tail'][0].set(
-                        int(self.ls_home['Tail'][0].get())+1)
-                    self.home_score += 1
-                    print(f'{runner} scored.', end='\t')
-            print()
-            print(f'1B: {self.bases[1]}'.ljust(25), end='')
-            print(f'2B: {self.bases[2]}'.ljust(25), end='')
-            print(f'3B: {self.bases[3]}'.ljust(25), end='')
-            print(f'{self.outs} outs')
-            print()
+        #Flattened probabilities of every entry in EVENTS, the hits split
+        #by the batter's shares of them
+        hits = [batter_data[stat] for stat in self.hits]
+        p_1b, p_2b, p_3b, p_hr = [p_hit*n/sum(hits) for n in hits]
+        p_groundout = p_out*OUT_WEIGHTS[0]
+        self.events = (
+            p_strikeout, p_walk, p_1b*0.5, p_1b*0.5, p_2b*0.8, p_2b*0.2,
+            p_3b, p_hr, p_groundout*self.gdp, p_groundout*(1-self.gdp),
+            p_out*(OUT_WEIGHTS[1]-OUT_WEIGHTS[0]),
+            p_out*(OUT_WEIGHTS[3]-OUT_WEIGHTS[1]))
 
-    def plate_appearance(self):
-        self.outcomes = {
-            'Strikeout': self.outcome_probability(
-                ['SO'], ['SO']),
-            'Walk': self.outcome_probability(
-                ['BB', 'IBB', 'HBP'], ['BB', 'IBB', 'HBP']),
-            'Hit': self.outcome_probability(
-                ['H'], ['H']),
-            'Out': 1-self.outcome_probability(
-                ['SO', 'BB', 'IBB', 'HBP', 'H'],
-                ['SO', 'BB', 'IBB', 'HBP', 'H'])}
-        self.ab_outcome = random.choices(
-            list(self.outcomes), list(self.outcomes.values()))[0]
-        if self.ab_outcome == 'Strikeout':
-            self.strikeout()
-        elif self.ab_outcome == 'Walk':
-            self.walk()
-        elif self.ab_outcome == 'Hit':
-            self.hit()
-        elif self.ab_outcome == 'Out':
-            self.out()
+        #Every (event, play) a plate appearance can end in, with the play
+        #detail that Simulation reports, drawn in one step
+        p_strikeouts = [b-a for a, b in zip(
+            (0,)+STRIKEOUT_WEIGHTS, STRIKEOUT_WEIGHTS)]
+        p_outs = [p_out*(b-a) for a, b in zip((0,)+OUT_WEIGHTS, OUT_WEIGHTS)]
+        weights = [p_strikeout*p for p in p_strikeouts]+p_walks\
+                  +[p_1b*0.5, p_1b*0.5, p_2b*0.8, p_2b*0.2, p_3b, p_hr,
+                    p_outs[0]*self.gdp, p_outs[0]*(1-self.gdp)]+p_outs[1:]
+        plays = [(STRIKEOUT, play) for play in STRIKEOUTS]\
+                +[(WALK, play) for play in self.walks]\
+                +[(SINGLE, '1B'), (SINGLE_EXTRA, '1B'), (DOUBLE, '2B'),
+                  (DOUBLE_EXTRA, '2B'), (TRIPLE, '3B'), (HOME_RUN, 'HR'),
+                  (DOUBLE_PLAY, 'Double Play'), (GROUNDOUT, 'Groundout'),
+                  (FLYOUT, 'Flyout'), (LINEOUT, 'Lineout'),
+                  (LINEOUT, 'Popout')]
+        self.plays = AliasSampler(weights, plays)
+        #The same plays from worst to best for the batter, for antithetic
+        #games
+        order = sorted(range(len(plays)),
+                       key=lambda k: EVENT_ORDER.index(plays[k][0]))
+        self.ordered_plays = CumulativeSampler(
+            [weights[k] for k in order], [plays[k] for k in order])
 
     def outcome_probability(self, s_bat, s_pitch, weights=['PA', 'TBF']):
         assert len(weights) == 2
@@ -764,186 +1437,3008 @@ class Game:
         weight_pitch = self.pitcher_data[weights[1]]
         p_outcome = (n_bat+n_pitch)/(weight_bat+weight_pitch)
         return p_outcome
-    
-    def strikeout(self):
-        specific = random.choices(
-            ['Swinging', 'Looking', 'Foul Tip'],
-            [0.70, 0.25, 0.05])[0]
-        if specific == 'Swinging':
-            print(f'{self.batter} strikes out swinging.', end='\t')
-        elif specific == 'Looking':
-            print(f'{self.batter} strikes out looking.', end='\t')
-        elif specific == 'Foul Tip':
-            print(f'{self.batter} strikes out on a foul tip.', end='\t')
-        self.outs += 1
-
-    def walk(self):
-        outcomes = {
-            'BB': self.outcome_probability(['BB'], ['BB']),
-            'IBB': self.outcome_probability(['IBB'], ['IBB']),
-            'HBP': self.outcome_probability(['HBP'], ['HBP'])}
-        specific = random.choices(
-            list(outcomes), list(outcomes.values()))[0]
-        if specific == 'BB':
-            print(f'{self.batter} walks.', end='\t')
-        elif specific == 'IBB':
-            print(f'{self.batter} intentionally walks.', end='\t')
-        elif specific == 'HBP':
-            print(f'{self.batter} hit by pitch.', end='\t')
-        if all([self.bases[1], self.bases[2], self.bases[3]]):
-            self.bases = dict(zip(self.bases, (
-                self.batter, self.bases[1],
-                self.bases[2], [self.bases[3]])))
-        elif self.bases[1] and self.bases[2]:
-            self.bases = dict(zip(self.bases, (
-                self.batter, self.bases[1], self.bases[2], [])))
-        elif self.bases[1] and self.bases[3]:
-            self.bases = dict(zip(self.bases, (
-                self.batter, self.bases[1], self.bases[3], [])))
-        elif self.bases[1]:
-            self.bases = dict(zip(self.bases, (
-                self.batter, self.bases[1], '', [])))
-        elif not self.bases[1]:
-            self.bases = dict(zip(self.bases, (
-                self.batter, self.bases[2], self.bases[3], [])))
-
-    def hit(self):
-        outcomes = {
-            '1B': self.batter_data['1B'],
-            '2B': self.batter_data['2B'],
-            '3B': self.batter_data['3B'],
-            'HR': self.batter_data['HR']}
-        specific = random.choices(
-            list(outcomes), list(outcomes.values()))[0]
-        x_bases = random.random()
-        if specific == '1B':
-            print(f'{self.batter} singles.', end='\t')
-            if x_bases < 0.5:
-                self.bases = dict(zip(self.bases, (
-                    self.batter, self.bases[1],
-                    self.bases[2], [self.bases[3]])))
-            else:
-                self.bases = dict(zip(self.bases, (
-                    self.batter, '', self.bases[1],
-                    [self.bases[2], self.bases[3]])))
-        elif specific == '2B':
-            print(f'{self.batter} doubles.', end='\t')
-            if x_bases < 0.8:
-                self.bases = dict(zip(self.bases, (
-                    '', self.batter, self.bases[1],
-                    [self.bases[3], self.bases[2]])))
-            else:
-                self.bases = dict(zip(self.bases, (
-                    '', self.batter, '',
-                    [self.bases[3], self.bases[2],
-                     self.bases[1]])))
-        elif specific == '3B':
-            print(f'{self.batter} triples.', end='\t')
-            self.bases = dict(zip(self.bases, (
-                '', '', self.batter,
-                [self.bases[3], self.bases[2],
-                 self.bases[1]])))
-        elif specific == 'HR':
-            print(f'{self.batter} homers.', end='\t')
-            self.bases = dict(zip(self.bases, (
-                '', '', '',
-                [self.bases[3], self.bases[2],
-                 self.bases[1], self.batter])))
-        if self.top:
-            self.ls_away['Tail'][1].set(
-                int(self.ls_away['Tail'][1].get())+1)
-        elif self.bottom:
-            self.ls_home['Tail'][1].set(
-                int(self.ls_home['Tail'][1].get())+1)
-
-    def out(self):
-        outcomes = {
-            'Groundout': 0.55,
-            'Flyout': 0.25,
-            'Lineout': 0.10,
-            'Popout': 0.10}
-        specific = random.choices(
-            list(outcomes), list(outcomes.values()))[0]
-        if specific == 'Groundout':
-            p_gdp = self.batter_data['GDP']/self.outcomes['Out']
-            gdp = random.choices([True, False], [p_gdp, 1-p_gdp])[0]
-            if self.bases[1] and self.outs < 2 and gdp:
-                print(f'{self.batter} grounds into a double play.',
-                      end='\t')
-                if self.outs == 0:
-                    self.bases = dict(zip(self.bases, (
-                        '', '', self.bases[2], [self.bases[3]])))
-                self.outs += 1
-            else:
-                print(f'{self.batter} grounds out.', end='\t')
-                if self.bases[1]:
-                    self.bases = dict(zip(self.bases, (
-                        '', self.bases[1], self.bases[2],
-                        [self.bases[3]])))
-                else:
-                    self.bases = dict(zip(self.bases, (
-                        '', self.bases[2], '', [self.bases[3]])))
-        elif specific == 'Flyout':
-            print(f'{self.batter} flies out.', end='\t')
-            if self.outs < 2:
-                self.bases = dict(zip(self.bases, (
-                    self.bases[1], '', self.bases[2],
-                    [self.bases[3]])))
-        elif specific == 'Lineout':
-            print(f'{self.batter} lines out.', end='\t')
-        elif specific == 'Popout':
-            print(f'{self.batter} pops out.', end='\t')
-        self.outs += 1
-
-def main():
-    teams = Teams()
 
-    configure_simulation = ConfigureSimulationGUI(teams.teams)
-    configure_simulation.display()
-    teams.away_team = configure_simulation.away_team
-    teams.home_team = configure_simulation.home_team
-    teams.compile_rosters()
+def alias_table(weights):
+    ''' Build Walker's alias table for sampling from weights in O(1)
 
-    configure_lineups = ConfigureLineupsGUI(
-        teams.teams,
-        teams.away_team, teams.home_team,
-        teams.away_roster, teams.home_roster,
-        teams.away_depth_chart, teams.home_depth_chart)
-    configure_lineups.display()
+Returns (probability, alias): draw a column k uniformly, keep it with
+probability[k], otherwise take alias[k].
+'''
+    n = len(weights)
+    total = sum(weights)
+    scaled = [max(w, 0)*n/total for w in weights]
+    probability, alias = [1.0]*n, list(range(n))
+    small = [k for k, p in enumerate(scaled) if p < 1]
+    large = [k for k, p in enumerate(scaled) if p >= 1]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        probability[s], alias[s] = scaled[s], l
+        scaled[l] -= 1-scaled[s]
+        if scaled[l] < 1:
+            small.append(l)
+        else:
+            large.append(l)
+    return probability, alias
 
-    away_starters = [configure_lineups.away_starters[pos]['Variable'].get()\
-                     for pos in configure_lineups.away_starters]
-    home_starters = [configure_lineups.home_starters[pos]['Variable'].get()\
-                     for pos in configure_lineups.home_starters]
-    away_lineup = dict(zip(
-        list(configure_lineups.away_batting_order),
-        [configure_lineups.away_starters[
-            configure_lineups.away_batting_order[i]['Variable'].get()
-            ]['Variable'].get()\
-         for i in list(configure_lineups.away_batting_order)]
-        ))
-    home_lineup = dict(zip(
-        list(configure_lineups.home_batting_order),
-        [configure_lineups.home_starters[
-            configure_lineups.home_batting_order[i]['Variable'].get()
-            ]['Variable'].get()\
-         for i in list(configure_lineups.home_batting_order)]
-        ))
+class AliasSampler:
+    ''' Draw one of values by weight from a single uniform in O(1)
 
-    away_starting_pitcher = configure_lineups.away_pitchers['Variable'].get()
-    home_starting_pitcher = configure_lineups.home_pitchers['Variable'].get()
+Each column of the alias table is kept as (column+probability, kept
+value, alias value), so a draw is an index and a compare without any
+allocation: u*n falls in column int(u*n) and keeps its value below the
+threshold.
+'''
+    def __init__(self, weights, values):
+        assert len(weights) == len(values)
+        probability, alias = alias_table(weights)
+        self.n = len(values)
+        columns = [(k+probability[k], values[k], values[alias[k]])\
+                   for k in range(self.n)]
+        #u*n can round up to n for u just below 1
+        self.columns = tuple(columns+columns[-1:])
 
-    i = 0
-    reps = int(configure_lineups.reps['Variable'].get())
-    while i < reps:
-        simulation = Game(
-            configure_lineups.away_team, configure_lineups.home_team,
-            configure_lineups.away_roster, configure_lineups.home_roster,
-            configure_lineups.away_depth_chart,
-            configure_lineups.home_depth_chart,
-            away_lineup, home_lineup,
-            away_starting_pitcher, home_starting_pitcher)
-        i += 1
+    def draw(self, u):
+        x = u*self.n
+        threshold, kept, alias = self.columns[int(x)]
+        return kept if x < threshold else alias
+
+class CumulativeSampler:
+    ''' Draw one of values by weight by inverting their cumulative weights
+
+Slower than AliasSampler, a bisection per draw, but monotone: a larger
+uniform never draws an earlier value, which antithetic games rely on.
+'''
+    def __init__(self, weights, values):
+        assert len(weights) == len(values)
+        cum_weights = list(itertools.accumulate(
+            [max(w, 0) for w in weights]))
+        self.cum_weights = tuple([c/cum_weights[-1] for c in cum_weights])
+        self.values = tuple(values)
+
+    def draw(self, u):
+        k = bisect.bisect_right(self.cum_weights, u)
+        return self.values[min(k, len(self.values)-1)]
+
+def matchup_table(lineup, roster, pitcher_data):
+    ''' Build the Matchup of every spot in a lineup against one pitcher
+'''
+    return {spot: Matchup(roster.get(batter), pitcher_data)\
+            for spot, batter in lineup.items()}
+
+class GameResult:
+    ''' Final line score of a simulated game
+'''
+    def __init__(self, away_team, home_team, away_line, home_line,
+                 away_hits, home_hits):
+        self.away, self.home = away_team, home_team
+        self.away_line, self.home_line = away_line, home_line
+        self.away_hits, self.home_hits = away_hits, home_hits
+        self.away_score = sum(away_line)
+        self.home_score = sum([r for r in home_line if r is not None])
+
+    @property
+    def innings(self):
+        return len(self.away_line)
+
+    @property
+    def winner(self):
+        return self.away if self.away_score > self.home_score else self.home
+
+    def __repr__(self):
+        return (f'GameResult({self.away} {self.away_score}, '
+                f'{self.home} {self.home_score}, {self.innings} innings)')
+
+#Fields of one play-by-play event. play is a key of PLAY_BY_PLAY (or
+#'Runner' for the extra-innings runner placed at second) and event its
+#index in EVENTS; bases and outs are the state before the play,
+#new_bases and new_outs the state after it. scorers are the names of the
+#runners who scored and runners the names on 1B, 2B and 3B afterwards
+PlayEvent = collections.namedtuple('PlayEvent', (
+    'game', 'inning', 'top', 'play', 'event', 'batter', 'pitcher',
+    'bases', 'outs', 'new_bases', 'new_outs', 'runs', 'scorers',
+    'runners'))
+
+class Sink:
+    ''' Where a Simulation writes its PlayEvents
+
+write is called with every event and close once no more will come; a
+sink used in a with statement is closed at the end of it.
+'''
+    def write(self, event):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ListSink(Sink):
+    ''' Keep every PlayEvent of a Simulation in memory
+'''
+    def __init__(self):
+        self.events = []
+
+    def write(self, event):
+        self.events.append(event)
+
+class TextSink(Sink):
+    ''' Render PlayEvents as the human-readable play-by-play
+'''
+    def __init__(self, file=None):
+        self.file = file
+
+    def write(self, event):
+        file = self.file if self.file is not None else sys.stdout
+        if event.play == 'Runner':
+            print(f'{event.batter} starting at second.', file=file)
+            return
+        text = [f'{event.batter} {PLAY_BY_PLAY[event.play]}\t']
+        text.extend([f'{name} scored.\t' for name in event.scorers])
+        text.append('\n')
+        text.extend([f'{base}B: {runner or ""}'.ljust(25)\
+                     for base, runner in enumerate(event.runners, 1)])
+        text.append(f'{event.new_outs} outs\n\n')
+        file.write(''.join(text))
+
+class JSONLSink(Sink):
+    ''' Write PlayEvents to a file as one JSON object per line
+'''
+    def __init__(self, path, buffering=2**16):
+        self.file = open(path, 'w', buffering=buffering)
+
+    def write(self, event):
+        self.file.write(json.dumps(event._asdict())+'\n')
+
+    def close(self):
+        self.file.close()
+
+class BinarySink(Sink):
+    ''' Write PlayEvents to a file as pickled blocks of tuples
+
+Events are held until block_size of them are pending, so a file of
+many games is written in a few large pickles; read_events reads it back.
+'''
+    def __init__(self, path, block_size=4096):
+        self.file = open(path, 'wb')
+        self.block_size = block_size
+        self.pending = []
+
+    def write(self, event):
+        self.pending.append(tuple(event))
+        if len(self.pending) >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            pickle.dump(self.pending, self.file, pickle.HIGHEST_PROTOCOL)
+            self.pending = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+def read_events(path):
+    ''' Yield the PlayEvents of a file written by BinarySink
+'''
+    with open(path, 'rb') as file:
+        while True:
+            try:
+                block = pickle.load(file)
+            except EOFError:
+                return
+            for fields in block:
+                yield PlayEvent(*fields)
+
+def open_sink(path):
+    ''' JSONLSink for a .jsonl or .json path, BinarySink otherwise
+'''
+    if os.path.splitext(path)[1] in ('.jsonl', '.json'):
+        return JSONLSink(path)
+    return BinarySink(path)
+
+BATTING_STATS = ('PA', 'H', '1B', '2B', '3B', 'HR', 'BB', 'IBB', 'HBP', 'SO',
+                 'GDP', 'R', 'RBI')
+PITCHING_STATS = ('TBF', 'H', 'BB', 'SO', 'R')
+
+def stat_columns(stats, counted):
+    ''' Map every play of PLAY_BY_PLAY to the columns of stats it counts in
+'''
+    return {play: tuple([stats.index(stat) for stat in counted[play]])\
+            for play in PLAY_BY_PLAY}
+
+#Walks count in BB whether intentional or not, as on FanGraphs
+BATTING_COLUMNS = stat_columns(BATTING_STATS, {
+    'Swinging': ('PA', 'SO'), 'Looking': ('PA', 'SO'),
+    'Foul Tip': ('PA', 'SO'), 'BB': ('PA', 'BB'),
+    'IBB': ('PA', 'BB', 'IBB'), 'HBP': ('PA', 'HBP'),
+    '1B': ('PA', 'H', '1B'), '2B': ('PA', 'H', '2B'),
+    '3B': ('PA', 'H', '3B'), 'HR': ('PA', 'H', 'HR'),
+    'Double Play': ('PA', 'GDP'), 'Groundout': ('PA',),
+    'Flyout': ('PA',), 'Lineout': ('PA',), 'Popout': ('PA',)})
+PITCHING_COLUMNS = stat_columns(PITCHING_STATS, {
+    'Swinging': ('TBF', 'SO'), 'Looking': ('TBF', 'SO'),
+    'Foul Tip': ('TBF', 'SO'), 'BB': ('TBF', 'BB'),
+    'IBB': ('TBF', 'BB'), 'HBP': ('TBF',),
+    '1B': ('TBF', 'H'), '2B': ('TBF', 'H'), '3B': ('TBF', 'H'),
+    'HR': ('TBF', 'H'), 'Double Play': ('TBF',), 'Groundout': ('TBF',),
+    'Flyout': ('TBF',), 'Lineout': ('TBF',), 'Popout': ('TBF',)})
+
+class BoxScore:
+    ''' Counting stats of both lineups and starters summed over games
+
+The counts live in two flat integer arrays. Batting row 0-8 is the away
+lineup and 9-17 the home lineup, by spot; pitching row 0 is the away
+starter and 1 the home starter. Each row holds one column per entry of
+BATTING_STATS or PITCHING_STATS. Box scores of the same matchup merge by
+adding the arrays, and lines turns the totals into stat lines.
+'''
+    runs = BATTING_STATS.index('R')
+    rbi = BATTING_STATS.index('RBI')
+    runs_allowed = PITCHING_STATS.index('R')
+
+    def __init__(self, away_team, home_team, away_lineup, home_lineup,
+                 away_sp, home_sp):
+        self.away, self.home = away_team, home_team
+        self.away_lineup, self.home_lineup = away_lineup, home_lineup
+        self.away_pitcher, self.home_pitcher = away_sp, home_sp
+        self.games = 0
+        self.batting = array.array('q', bytes(8*18*len(BATTING_STATS)))
+        self.pitching = array.array('q', bytes(8*2*len(PITCHING_STATS)))
+
+    @classmethod
+    def from_simulation(cls, simulation):
+        return cls(simulation.away, simulation.home,
+                   simulation.away_lineup, simulation.home_lineup,
+                   simulation.away_pitcher, simulation.home_pitcher)
+
+    def record(self, top, spot, play, runs):
+        ''' Count a plate appearance of the batter in a lineup spot
+'''
+        batting, pitching = self.batting, self.pitching
+        batter = ((0 if top else 9)+spot-1)*len(BATTING_STATS)
+        for column in BATTING_COLUMNS[play]:
+            batting[batter+column] += 1
+        pitcher = (1 if top else 0)*len(PITCHING_STATS)
+        for column in PITCHING_COLUMNS[play]:
+            pitching[pitcher+column] += 1
+        if runs:
+            pitching[pitcher+self.runs_allowed] += runs
+            if play != 'Double Play':
+                batting[batter+self.rbi] += runs
+
+    def score(self, top, spot):
+        ''' Count a run scored by the runner from a lineup spot
+'''
+        self.batting[((0 if top else 9)+spot-1)*len(BATTING_STATS)\
+                     +self.runs] += 1
+
+    def merge(self, other):
+        assert (self.away_lineup, self.home_lineup)\
+               == (other.away_lineup, other.home_lineup)
+        self.games += other.games
+        self.batting = array.array('q', [a+b for a, b in zip(
+            self.batting, other.batting)])
+        self.pitching = array.array('q', [a+b for a, b in zip(
+            self.pitching, other.pitching)])
+        return self
+
+    def lines(self, *, away=False, per_game=False):
+        ''' Stat lines of one team as {'Lineup': {}, 'Pitchers': {}}
+
+The lineup is keyed by batter in batting order. With per_game the totals
+are divided by the number of games, giving projected stat lines.
+'''
+        scale = 1/self.games if per_game and self.games else 1
+        lineup = self.away_lineup if away else self.home_lineup
+        pitcher = self.away_pitcher if away else self.home_pitcher
+        box_score = {'Lineup': {}, 'Pitchers': {}}
+        n = len(BATTING_STATS)
+        for spot in range(1, 10):
+            row = ((0 if away else 9)+spot-1)*n
+            box_score['Lineup'][lineup[spot]] = dict(zip(
+                BATTING_STATS,
+                [count*scale for count in self.batting[row:row+n]]))
+        n = len(PITCHING_STATS)
+        row = (0 if away else 1)*n
+        box_score['Pitchers'][pitcher] = dict(zip(
+            PITCHING_STATS,
+            [count*scale for count in self.pitching[row:row+n]]))
+        return box_score
+
+    def report(self, *, per_game=True):
+        ''' Both teams' stat lines as printable lines
+'''
+        lines = []
+        for team, away in ((self.away, True), (self.home, False)):
+            box_score = self.lines(away=away, per_game=per_game)
+            lines.append(team.ljust(25)+''.join(
+                [stat.rjust(7) for stat in BATTING_STATS]))
+            for player, line in box_score['Lineup'].items():
+                lines.append(str(player).ljust(25)+''.join(
+                    [f'{line[stat]:7.2f}' for stat in BATTING_STATS]))
+            lines.append(''.ljust(25)+''.join(
+                [stat.rjust(7) for stat in PITCHING_STATS]))
+            for player, line in box_score['Pitchers'].items():
+                lines.append(str(player).ljust(25)+''.join(
+                    [f'{line[stat]:7.2f}' for stat in PITCHING_STATS]))
+            lines.append('')
+        return '\n'.join(lines)
+
+#Uniforms drawn at a time by Simulation.draw_uniforms
+UNIFORM_BLOCK = 1024
+
+class Simulation:
+    ''' Simulate games between two lineups without any display
+
+The rosters, lineups ({spot: player}) and starting pitchers are the ones
+produced by Teams.compile_rosters and ConfigureLineupsGUI. The same
+instance can simulate any number of games; each call to simulate_game
+returns a GameResult. If a callback is given, it is called with the
+simulation after every plate appearance and at the end of the game.
+If a sink is given, every play is written to it as a PlayEvent; without
+one no event is built at all. With box_score, the counting stats of all
+the games simulated are summed in the BoxScore self.box_score.
+
+The matchup tables are kept in tables under (batting team, pitching team,
+pitcher), so Simulations that share the dict build each table once. Only
+share it between Simulations whose teams always bat the same lineups.
+'''
+    def __init__(self, away_team, home_team, away_roster, home_roster,
+                 away_lineup, home_lineup, away_sp, home_sp, *,
+                 xrunner=True, sink=None, box_score=False, rng=None,
+                 callback=None, tables=None):
+        self.away, self.home = away_team, home_team
+        self.away_roster, self.home_roster = away_roster, home_roster
+        self.away_lineup, self.home_lineup = away_lineup, home_lineup
+        self.away_pitcher, self.home_pitcher = away_sp, home_sp
+        self.xrunner = xrunner
+        self.sink = sink
+        self.game = 0
+        self.rng = rng if rng is not None else random.Random()
+        self.uniforms, self.uniforms_rng = [], None
+        #Per-team uniforms of an antithetic pair, see simulate_pair
+        self.streams = None
+        self.reflect = False
+        self.stream_index = [0, 0]
+        self.callback = callback
+        tables = tables if tables is not None else {}
+        if (away_team, home_team, home_sp) not in tables:
+            tables[away_team, home_team, home_sp] = matchup_table(
+                away_lineup, away_roster, home_roster.get(home_sp))
+        if (home_team, away_team, away_sp) not in tables:
+            tables[home_team, away_team, away_sp] = matchup_table(
+                home_lineup, home_roster, away_roster.get(away_sp))
+        self.away_matchups = tables[away_team, home_team, home_sp]
+        self.home_matchups = tables[home_team, away_team, away_sp]
+        self.box_score = BoxScore.from_simulation(self) if box_score\
+                         else None
+        self.reset()
+
+    def reset(self):
+        ''' Return the game state to the first pitch
+'''
+        self.away_index, self.home_index = 9, 9
+        self.away_score, self.home_score = 0, 0
+        self.away_line, self.home_line = [], []
+        self.away_hits, self.home_hits = 0, 0
+        self.top, self.bottom = False, False
+        self.inning = 1
+        self.outs = 0
+        self.gameover = False
+        #Bit 0 = 1B, 1 = 2B, 2 = 3B; runners[base] is the lineup spot of
+        #the runner there and runners[0] the batter
+        self.bases = 0
+        self.runners = [0, 0, 0, 0]
+
+    def simulate_game(self):
+        self.reset()
+        self.game += 1
+        if self.box_score is not None:
+            self.box_score.games += 1
+        return self.finish_game()
+
+    def finish_game(self):
+        while self.inning <= 9 or self.away_score == self.home_score:
+            self.simulate_inning()
+            self.inning += 1
+        self.gameover = True
+        if self.callback is not None:
+            self.callback(self)
+        return GameResult(
+            self.away, self.home, self.away_line, self.home_line,
+            self.away_hits, self.home_hits)
+
+    def snapshot(self):
+        ''' The state of the game in progress as a dict of plain values
+
+It holds everything the rest of the game depends on: the score, the
+base-out state and batting order positions, the state of self.rng and
+the uniforms already drawn from it, and the streams of an antithetic
+pair. It can be pickled or written as JSON, and restore followed by
+resume_game plays the game out exactly as it would have gone. Taken from
+the callback, it is the state after a plate appearance. The rosters,
+sink and box score are not part of it.
+'''
+        version, internal, gauss = self.rng.getstate()
+        return {
+            'game': self.game, 'inning': self.inning,
+            'top': self.top, 'bottom': self.bottom,
+            'outs': self.outs, 'bases': self.bases,
+            'runners': list(self.runners),
+            'away_index': self.away_index, 'home_index': self.home_index,
+            'away_score': self.away_score, 'home_score': self.home_score,
+            'away_line': list(self.away_line),
+            'home_line': list(self.home_line),
+            'away_hits': self.away_hits, 'home_hits': self.home_hits,
+            'gameover': self.gameover,
+            'rng': [version, list(internal), gauss],
+            'uniforms': list(self.uniforms)\
+                        if self.uniforms_rng is self.rng else [],
+            'streams': None if self.streams is None\
+                       else [list(stream) for stream in self.streams],
+            'reflect': self.reflect,
+            'stream_index': list(self.stream_index)}
+
+    def restore(self, state):
+        ''' Return to a state taken by snapshot, with the same teams
+'''
+        for name in ('game', 'inning', 'top', 'bottom', 'outs', 'bases',
+                     'away_index', 'home_index', 'away_score',
+                     'home_score', 'away_hits', 'home_hits', 'gameover',
+                     'reflect'):
+            setattr(self, name, state[name])
+        self.runners = list(state['runners'])
+        self.away_line = list(state['away_line'])
+        self.home_line = list(state['home_line'])
+        version, internal, gauss = state['rng']
+        self.rng.setstate((version, tuple(internal), gauss))
+        self.uniforms, self.uniforms_rng = list(state['uniforms']), self.rng
+        self.streams = None if state['streams'] is None\
+                       else tuple([list(stream)\
+                                   for stream in state['streams']])
+        self.stream_index = list(state['stream_index'])
+        if self.top or self.bottom:
+            self.batting_side()
+
+    def resume_game(self):
+        ''' Play out a game from a restored snapshot and return its result
+'''
+        if not self.gameover:
+            if self.top or self.bottom:
+                if self.outs < 3:
+                    self.finish_half_inning()
+                if self.top:
+                    self.finish_inning()
+                self.inning += 1
+            return self.finish_game()
+        return GameResult(
+            self.away, self.home, self.away_line, self.home_line,
+            self.away_hits, self.home_hits)
+
+    def simulate_pair(self):
+        ''' Simulate an antithetic pair of games and return both results
+
+Each team draws its plate appearances from its own stream of uniforms,
+and the second game replays both streams reflected (u to 1-u) through
+the matchups' ordered_plays, so a team that hit well in the first game
+tends to hit badly in the second. Each game alone is an ordinary game.
+'''
+        self.streams = ([], [])
+        try:
+            results = []
+            for reflect in (False, True):
+                self.reflect = reflect
+                self.stream_index = [0, 0]
+                results.append(self.simulate_game())
+        finally:
+            self.streams = None
+        return results
+
+    def antithetic_uniform(self):
+        ''' Next uniform of the batting team's stream in simulate_pair
+'''
+        stream = self.streams[self.top]
+        index = self.stream_index[self.top]
+        if index == len(stream):
+            stream.append(self.rng.random())
+        self.stream_index[self.top] = index+1
+        return 1-stream[index] if self.reflect else stream[index]
+
+    def simulate_inning(self):
+        self.away_line.append(0)
+        self.top, self.bottom = True, False
+        self.half_inning()
+        self.finish_inning()
+
+    def finish_inning(self):
+        if self.inning >= 9 and self.home_score > self.away_score:
+            self.home_line.append(None)
+            return
+        self.home_line.append(0)
+        self.top, self.bottom = False, True
+        self.half_inning()
+
+    def batting_side(self):
+        ''' Set the lineup, matchups and opposing pitcher of the half
+'''
+        if self.top:
+            self.lineup, self.matchups = self.away_lineup, self.away_matchups
+            self.pitcher = self.home_pitcher
+        else:
+            self.lineup, self.matchups = self.home_lineup, self.home_matchups
+            self.pitcher = self.away_pitcher
+
+    def half_inning(self):
+        self.batting_side()
+        self.bases = 0
+        if self.xrunner and self.inning > 9:
+            self.bases = 0b010
+            self.runners[2] = self.away_index if self.top\
+                              else self.home_index
+        self.outs = 0
+        if self.bases and self.sink is not None:
+            self.emit('Runner', None, 0, 0, 0, ())
+        self.finish_half_inning()
+
+    def finish_half_inning(self):
+        matchups = self.matchups
+        while self.outs < 3:
+            if self.top:
+                self.away_index = self.away_index%9+1
+                self.runners[0] = self.away_index
+            else:
+                self.home_index = self.home_index%9+1
+                self.runners[0] = self.home_index
+            self.matchup = matchups[self.runners[0]]
+            self.plate_appearance()
+            if self.callback is not None:
+                self.callback(self)
+
+    def advance_runners(self, event, play):
+        ''' Move the batter and runners for an event index of EVENTS
+'''
+        bases, outs = self.bases, self.outs
+        self.bases, runs, self.outs, moves = ADVANCES[event][outs][bases]
+        runners = self.runners
+        if self.sink is not None:
+            scorers = tuple([self.lineup.get(runners[base])\
+                             for base in SCORER_ORDER[event]\
+                             if moves[base] == 4])
+        for base in (3, 2, 1, 0):
+            dest = moves[base]
+            if dest == 4:
+                self.score_run(runners[base])
+            elif dest:
+                runners[dest] = runners[base]
+        if self.box_score is not None:
+            self.box_score.record(self.top, runners[0], play, runs)
+        if self.sink is not None:
+            self.emit(play, event, bases, outs, runs, scorers)
+
+    def emit(self, play, event, bases, outs, runs, scorers):
+        ''' Write a PlayEvent for the play that led to the current state
+'''
+        batter = self.runners[2] if play == 'Runner' else self.runners[0]
+        self.sink.write(PlayEvent(
+            self.game, self.inning, self.top, play, event,
+            self.lineup.get(batter), self.pitcher, bases, outs,
+            self.bases, self.outs, runs, scorers,
+            tuple([self.lineup.get(self.runners[base])\
+                   if self.bases>>(base-1) & 1 else None\
+                   for base in (1, 2, 3)])))
+
+    def score_run(self, runner):
+        if self.top:
+            self.away_line[-1] += 1
+            self.away_score += 1
+        else:
+            self.home_line[-1] += 1
+            self.home_score += 1
+        if self.box_score is not None:
+            self.box_score.score(self.top, runner)
+
+    def draw_uniforms(self):
+        ''' Refill self.uniforms with a block of uniforms from self.rng
+
+The block is tagged with the rng it came from, so assigning a new rng
+(as run_chunk does) discards what is left of the old stream.
+'''
+        random = self.rng.random
+        self.uniforms = [random() for _ in itertools.repeat(
+            None, UNIFORM_BLOCK)]
+        self.uniforms_rng = self.rng
+        return self.uniforms
+
+    def plate_appearance(self):
+        ''' Draw the play of the current matchup and apply it
+'''
+        if self.streams is None:
+            uniforms = self.uniforms
+            if not uniforms or self.uniforms_rng is not self.rng:
+                uniforms = self.draw_uniforms()
+            event, play = self.matchup.plays.draw(uniforms.pop())
+        else:
+            event, play = self.matchup.ordered_plays.draw(
+                self.antithetic_uniform())
+        if event == DOUBLE_PLAY:
+            if not self.bases & 1 or self.outs == 2:
+                event, play = GROUNDOUT, 'Groundout'
+        elif SINGLE <= event <= HOME_RUN:
+            if self.top:
+                self.away_hits += 1
+            else:
+                self.home_hits += 1
+        self.advance_runners(event, play)
+
+class BatchResult:
+    ''' Final scores of a batch of simulated games, as NumPy arrays
+'''
+    def __init__(self, away_team, home_team, away_score, home_score,
+                 innings):
+        self.away, self.home = away_team, home_team
+        self.away_score, self.home_score = away_score, home_score
+        self.innings = innings
+
+    def __len__(self):
+        return len(self.innings)
+
+    @property
+    def away_wins(self):
+        return int((self.away_score > self.home_score).sum())
+
+    @property
+    def home_wins(self):
+        return len(self)-self.away_wins
+
+class RunningMoments:
+    ''' Running mean and variance of a stream of values (Welford)
+
+Only the count, mean and sum of squared deviations are kept, and two
+instances fed from different streams merge exactly (Chan et al.).
+'''
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.n += 1
+        delta = value-self.mean
+        self.mean += delta/self.n
+        self.m2 += delta*(value-self.mean)
+
+    def add_array(self, values):
+        ''' Add a NumPy array of values in one step
+'''
+        if len(values) == 0:
+            return
+        other = RunningMoments()
+        other.n = len(values)
+        other.mean = float(values.mean())
+        other.m2 = float(((values-other.mean)**2).sum())
+        self.merge(other)
+
+    def merge(self, other):
+        n = self.n+other.n
+        if n == 0:
+            return self
+        delta = other.mean-self.mean
+        self.m2 += other.m2+delta*delta*self.n*other.n/n
+        self.mean += delta*other.n/n
+        self.n = n
+        return self
+
+    @property
+    def variance(self):
+        return self.m2/(self.n-1) if self.n > 1 else 0.0
+
+    @property
+    def stderr(self):
+        return (self.variance/self.n)**0.5 if self.n else 0.0
+
+    def interval(self, z=1.96):
+        ''' Normal confidence interval of the mean
+'''
+        return self.mean-z*self.stderr, self.mean+z*self.stderr
+
+class ControlVariates:
+    ''' Mean of a value corrected by control variates of known means
+
+Running sums of the value y and of the controls x are kept, and the
+estimate is the regression estimator mean(y)-beta@(mean(x)-means), with
+beta fitted from the same sums. Its variance is the residual variance of
+y given x, so controls that y follows closely shrink the interval. With
+no means it is a plain mean.
+'''
+    def __init__(self, means=()):
+        self.means = np.array(means, dtype=float)
+        size = len(self.means)+1
+        self.n = 0
+        self.sums = np.zeros(size)
+        self.products = np.zeros((size, size))
+
+    def add_array(self, y, x=None):
+        ''' Add values y and the (len(y), controls) array x of their controls
+'''
+        columns = np.column_stack([y] if x is None else [y, x]).astype(float)
+        self.n += len(columns)
+        self.sums += columns.sum(axis=0)
+        self.products += columns.T@columns
+
+    def estimate(self):
+        ''' The estimate of the mean of y and its standard error
+'''
+        mean = self.sums/self.n
+        cov = (self.products-self.n*np.outer(mean, mean))/max(self.n-1, 1)
+        estimate, variance = mean[0], cov[0, 0]
+        if len(self.means):
+            beta = np.linalg.lstsq(cov[1:, 1:], cov[1:, 0], rcond=None)[0]
+            estimate -= beta@(mean[1:]-self.means)
+            variance -= cov[0, 1:]@beta
+        return float(estimate), float(max(variance, 0)/self.n)**0.5
+
+class GameStats:
+    ''' Aggregate of any number of game results in constant memory
+
+Results are added one at a time (GameResult) or a batch at a time
+(BatchResult) and nothing about individual games is kept: win and
+extra-innings counts, histograms of the run differential (away minus
+home) and total runs, and RunningMoments of each team's runs. The
+histograms have one bin per distinct score seen, so their size does not
+grow with the number of games. Stats of separate runs combine with merge,
+along with their BoxScore if one was kept.
+'''
+    def __init__(self, away_team, home_team):
+        self.away, self.home = away_team, home_team
+        self.games = 0
+        self.away_wins = 0
+        self.extra_innings = 0
+        self.differential = collections.Counter()
+        self.total_runs = collections.Counter()
+        self.away_runs = RunningMoments()
+        self.home_runs = RunningMoments()
+        self.run_differential = RunningMoments()
+        self.box_score = None
+
+    def add(self, result):
+        away, home = result.away_score, result.home_score
+        self.games += 1
+        self.away_wins += away > home
+        self.extra_innings += result.innings > 9
+        self.differential[away-home] += 1
+        self.total_runs[away+home] += 1
+        self.away_runs.add(away)
+        self.home_runs.add(home)
+        self.run_differential.add(away-home)
+
+    def add_batch(self, results):
+        away = results.away_score.astype(np.int64)
+        home = results.home_score.astype(np.int64)
+        self.games += len(results)
+        self.away_wins += results.away_wins
+        self.extra_innings += int((results.innings > 9).sum())
+        for histogram, values in ((self.differential, away-home),
+                                  (self.total_runs, away+home)):
+            bins, counts = np.unique(values, return_counts=True)
+            histogram.update(dict(zip(bins.tolist(), counts.tolist())))
+        self.away_runs.add_array(away)
+        self.home_runs.add_array(home)
+        self.run_differential.add_array(away-home)
+
+    def merge(self, other):
+        assert (self.away, self.home) == (other.away, other.home)
+        self.games += other.games
+        self.away_wins += other.away_wins
+        self.extra_innings += other.extra_innings
+        self.differential.update(other.differential)
+        self.total_runs.update(other.total_runs)
+        self.away_runs.merge(other.away_runs)
+        self.home_runs.merge(other.home_runs)
+        self.run_differential.merge(other.run_differential)
+        if other.box_score is not None:
+            if self.box_score is None:
+                #An empty copy, so later merges never change other's
+                box = other.box_score
+                self.box_score = BoxScore(
+                    box.away, box.home, box.away_lineup, box.home_lineup,
+                    box.away_pitcher, box.home_pitcher)
+            self.box_score.merge(other.box_score)
+        return self
+
+    def __len__(self):
+        return self.games
+
+    @property
+    def home_wins(self):
+        return self.games-self.away_wins
+
+    @property
+    def p_away_win(self):
+        return self.away_wins/self.games if self.games else 0.0
+
+    @property
+    def p_extra_innings(self):
+        return self.extra_innings/self.games if self.games else 0.0
+
+    def win_interval(self, z=1.96):
+        ''' Normal confidence interval of the away team's win probability
+'''
+        p = self.p_away_win
+        half = z*(p*(1-p)/self.games)**0.5 if self.games else 0.0
+        return p-half, p+half
+
+    def report(self, z=1.96):
+        ''' Summary of the aggregate as printable lines
+'''
+        low, high = self.win_interval(z)
+        lines = [
+            f'{self.away}: {self.away_wins} wins '
+            f'({self.p_away_win:.2%}, {low:.2%}-{high:.2%})',
+            f'{self.home}: {self.home_wins} wins']
+        for team, runs in ((self.away, self.away_runs),
+                           (self.home, self.home_runs)):
+            low, high = runs.interval(z)
+            lines.append(f'{team} runs: {runs.mean:.3f} '
+                         f'({low:.3f}-{high:.3f}, '
+                         f'sd {runs.variance**0.5:.3f})')
+        lines.append(f'Extra innings: {self.p_extra_innings:.2%}')
+        return '\n'.join(lines)
+
+class BatchSimulation:
+    ''' Simulate many games of one matchup in lockstep with NumPy
+
+Each live game is a slot in a few small arrays: the inning and half, the
+base-out state (outs*8+bases, 24 once the side is retired), the lineup
+row and runs of the batting and fielding teams. Every step resolves one
+plate appearance in all live games at once from a single uniform draw
+each, then retires the games that ended.
+
+away_matchups and home_matchups may also be lists of the tables of
+several games, which are then simulated side by side: simulate plays
+game i as pairing[i] of the lists.
+'''
+    #Base-out state and runs after event*24+state, built on first use
+    next_state = runs = None
+
+    def __init__(self, away_team, home_team, away_matchups, home_matchups,
+                 *, xrunner=True, seed=None):
+        if np is None:
+            raise ImportError('BatchSimulation requires NumPy')
+        self.away, self.home = away_team, home_team
+        self.xrunner = xrunner
+        self.rng = np.random.default_rng(seed)
+        if isinstance(away_matchups, dict):
+            away_matchups, home_matchups = [away_matchups], [home_matchups]
+
+        #Lineup rows 0-8 of each pairing are the away spots and 9-17 the
+        #home spots; entry row*len(EVENTS)+column is a batter's alias
+        #table column, and its alias an event index
+        probability, alias = [], []
+        for away_table, home_table in zip(away_matchups, home_matchups):
+            for matchup in [away_table[spot] for spot in range(1, 10)]\
+                           +[home_table[spot] for spot in range(1, 10)]:
+                p_column, a_column = alias_table(matchup.events)
+                probability.extend(p_column)
+                alias.extend(a_column)
+        self.probability = np.array(probability)
+        self.alias = np.array(alias, dtype=np.intp)
+        rows = len(self.probability)//len(EVENTS)
+        self.next_row = np.array(
+            [(row+1)%9+row//9*9 for row in range(rows)], dtype=np.intp)
+
+        if BatchSimulation.next_state is None:
+            next_state, runs = [], []
+            for event in range(len(EVENTS)):
+                for outs in range(3):
+                    for bases in range(8):
+                        b, r, o = TRANSITIONS[event][outs][bases]
+                        next_state.append(o*8+b)
+                        runs.append(r)
+            BatchSimulation.next_state = np.array(next_state, dtype=np.intp)
+            BatchSimulation.runs = np.array(runs, dtype=np.int16)
+
+    @classmethod
+    def from_simulation(cls, simulation, *, seed=None):
+        return cls(
+            simulation.away, simulation.home,
+            simulation.away_matchups, simulation.home_matchups,
+            xrunner=simulation.xrunner, seed=seed)
+
+    def simulate(self, n, pairing=None):
+        ''' Simulate n games and return a BatchResult
+'''
+        n_events = len(EVENTS)
+        away_score = np.zeros(n, dtype=np.int16)
+        home_score = np.zeros(n, dtype=np.int16)
+        innings = np.zeros(n, dtype=np.int16)
+
+        game = np.arange(n)
+        inning = np.ones(n, dtype=np.int16)
+        bottom = np.zeros(n, dtype=bool)
+        state = np.zeros(n, dtype=np.intp)
+        batting = np.zeros(n, dtype=np.intp) if pairing is None\
+                  else np.asarray(pairing, dtype=np.intp)*18
+        fielding = batting+9
+        batting_runs = np.zeros(n, dtype=np.int16)
+        fielding_runs = np.zeros(n, dtype=np.int16)
+        while len(game):
+            #Plate appearance
+            u = self.rng.random(len(game))*n_events
+            column = u.astype(np.intp)
+            entry = batting*n_events+column
+            event = np.where(
+                u-column < self.probability[entry], column, self.alias[entry])
+            transition = event*24+state
+            batting_runs += self.runs[transition]
+            state = self.next_state[transition]
+            batting = self.next_row[batting]
+
+            #End of half inning
+            over = state == 24
+            if not over.any():
+                continue
+            late = over & (inning >= 9)
+            finished = late & np.where(
+                bottom, batting_runs != fielding_runs,
+                fielding_runs > batting_runs)
+            if finished.any():
+                ended = game[finished]
+                ended_bottom = bottom[finished]
+                away_score[ended] = np.where(
+                    ended_bottom, fielding_runs[finished],
+                    batting_runs[finished])
+                home_score[ended] = np.where(
+                    ended_bottom, batting_runs[finished],
+                    fielding_runs[finished])
+                innings[ended] = inning[finished]
+                live = ~finished
+                game, inning, bottom = game[live], inning[live], bottom[live]
+                state, over = state[live], over[live]
+                batting, fielding = batting[live], fielding[live]
+                batting_runs = batting_runs[live]
+                fielding_runs = fielding_runs[live]
+
+            #Change sides
+            inning += over & bottom
+            bottom ^= over
+            batting, fielding = np.where(over, fielding, batting),\
+                                np.where(over, batting, fielding)
+            batting_runs, fielding_runs = \
+                np.where(over, fielding_runs, batting_runs),\
+                np.where(over, batting_runs, fielding_runs)
+            state[over] = 0
+            if self.xrunner:
+                state[over & (inning > 9)] = 0b010
+        return BatchResult(
+            self.away, self.home, away_score, home_score, innings)
+
+def half_inning_table(matchups, start_state=0, *, max_runs=20,
+                      tolerance=1e-15):
+    ''' Exact distribution of a half inning from each leadoff spot
+
+The half inning is a Markov chain over the batting spot and the 24
+base-out states. Since every plate appearance moves to the next spot,
+the spot after n plate appearances is known and the chain only has to
+track (runs, base-out state). Returns an array indexed by
+[leadoff spot-1, runs, next leadoff spot-1]; runs beyond max_runs are
+counted as max_runs.
+'''
+    events = np.clip(np.array(
+        [matchups[spot].events for spot in range(1, 10)]), 0, None)
+    events /= events.sum(axis=1, keepdims=True)
+    #step[spot, state, runs, next state], next state 24 is the third out
+    step = np.zeros((9, 24, 5, 25))
+    for event in range(len(EVENTS)):
+        for outs in range(3):
+            for bases in range(8):
+                b, r, o = TRANSITIONS[event][outs][bases]
+                step[:, outs*8+bases, r, min(o*8+b, 24)] += events[:, event]
+    step = step.reshape(9, 24, 5*25)
+
+    leadoff = np.arange(9)
+    dist = np.zeros((9, max_runs+1, 24))
+    dist[:, 0, start_state] = 1
+    table = np.zeros((9, max_runs+1, 9))
+    n = 0
+    while dist.sum() > tolerance:
+        spots = (leadoff+n)%9
+        moved = (dist@step[spots]).reshape(9, max_runs+1, 5, 25)
+        after = np.zeros((9, max_runs+1, 25))
+        for r in range(5):
+            after[:, r:] += moved[:, :max_runs+1-r, r]
+            after[:, max_runs] += moved[:, max_runs+1-r:, r].sum(axis=1)
+        table[leadoff, :, (spots+1)%9] += after[..., 24]
+        dist = after[..., :24]
+        n += 1
+    return table
+
+class ExactResult:
+    ''' Exact outcome probabilities of a game from MarkovSolver
+
+score[a, h] is the probability of a final score of a-h, and
+away_innings/home_innings[i] the run distribution of inning i+1 (1-9)
+given that the half inning is played.
+'''
+    def __init__(self, away_team, home_team, score, away_innings,
+                 home_innings, p_extra_innings):
+        self.away, self.home = away_team, home_team
+        self.score = score
+        self.away_innings, self.home_innings = away_innings, home_innings
+        self.p_extra_innings = p_extra_innings
+        runs = np.arange(len(score))
+        self.p_away_win = float(np.tril(score, -1).sum())
+        self.p_home_win = float(np.triu(score, 1).sum())
+        self.away_expected = float(score.sum(axis=1)@runs)
+        self.home_expected = float(score.sum(axis=0)@runs)
+
+    def __repr__(self):
+        return (f'ExactResult({self.away} {self.p_away_win:.4f}, '
+                f'{self.home} {self.p_home_win:.4f})')
+
+class MarkovSolver:
+    ''' Solve a game exactly as a chain of half-inning Markov chains
+
+Uses the same matchup tables and advancement rules as Simulation, so the
+result is what an infinite number of reps would converge to (up to the
+max_score and tolerance truncations), without any sampling noise.
+'''
+    def __init__(self, away_team, home_team, away_matchups, home_matchups,
+                 *, xrunner=True, max_score=30, tolerance=1e-12):
+        if np is None:
+            raise ImportError('MarkovSolver requires NumPy')
+        self.away, self.home = away_team, home_team
+        self.xrunner = xrunner
+        self.max_score = max_score
+        self.tolerance = tolerance
+        self.away_table = half_inning_table(away_matchups)
+        self.home_table = half_inning_table(home_matchups)
+        if xrunner:
+            self.away_xtable = half_inning_table(away_matchups, 0b010)
+            self.home_xtable = half_inning_table(home_matchups, 0b010)
+        else:
+            self.away_xtable, self.home_xtable = \
+                self.away_table, self.home_table
+
+    @classmethod
+    def from_simulation(cls, simulation, **kwargs):
+        return cls(
+            simulation.away, simulation.home,
+            simulation.away_matchups, simulation.home_matchups,
+            xrunner=simulation.xrunner, **kwargs)
+
+    def transition_matrix(self, table):
+        ''' Half inning as a matrix from (score, leadoff) to itself
+'''
+        size = self.max_score+1
+        matrix = np.zeros((size, 9, size, 9))
+        for runs in range(size):
+            gained = table[:, :size-runs]
+            matrix[runs, :, runs:runs+gained.shape[1]] = gained
+            matrix[runs, :, -1] += table[:, size-runs:].sum(axis=1)
+        return matrix.reshape(size*9, size*9)
+
+    def solve(self):
+        size = self.max_score+1
+        away_matrix = self.transition_matrix(self.away_table)
+        home_matrix = self.transition_matrix(self.home_table)
+        away_runs = self.away_table.sum(axis=2)
+        home_runs = self.home_table.sum(axis=2)
+        score = np.zeros((size, size))
+        away_innings, home_innings = [], []
+
+        #game[(a, s), (h, t)]: away team has a runs and leadoff spot s,
+        #home team h runs and leadoff spot t
+        game = np.zeros((size*9, size*9))
+        game[0, 0] = 1
+        away_wins = np.tril(np.ones((size, size), dtype=bool), -1)
+        for inning in range(1, 10):
+            leadoff = game.reshape(size, 9, -1).sum(axis=(0, 2))
+            away_innings.append(leadoff@away_runs/leadoff.sum())
+            game = away_matrix.T@game
+            if inning == 9:
+                #The bottom of the ninth is not played if the home team leads
+                final = game.reshape(size, 9, size, 9).sum(axis=(1, 3))
+                score += np.where(away_wins.T, final, 0)
+                game = game*np.repeat(np.repeat(
+                    ~away_wins.T, 9, axis=0), 9, axis=1)
+            leadoff = game.reshape(-1, size, 9).sum(axis=(0, 1))
+            home_innings.append(leadoff@home_runs/leadoff.sum())
+            game = game@home_matrix
+        final = game.reshape(size, 9, size, 9).sum(axis=(1, 3))
+        score += np.where(np.eye(size, dtype=bool), 0, final)
+
+        #Extra innings only continue from a tie, so track tie[t, s, u]:
+        #tied at t runs with leadoff spots s and u
+        tie = np.einsum('asat->ast', game.reshape(size, 9, size, 9))
+        p_extra_innings = float(tie.sum())
+        away_runs = self.away_xtable.sum(axis=2)
+        home_runs = self.home_xtable.sum(axis=2)
+        max_runs = self.away_xtable.shape[1]
+        tied = np.eye(max_runs, dtype=bool)
+        while tie.sum() > self.tolerance:
+            inning_score = np.einsum(
+                'tsu,sa,uh->tah', tie, away_runs, home_runs, optimize=True)
+            inning_score[:, tied] = 0
+            for t in range(size):
+                high = min(size-t, max_runs)
+                score[t:t+high, t:t+high] += inning_score[t, :high, :high]
+            moved = np.einsum(
+                'tsu,srn,urm->rtnm', tie, self.away_xtable,
+                self.home_xtable, optimize=True)
+            tie = np.zeros_like(tie)
+            for r in range(max_runs):
+                tie[r:] += moved[r, :size-r]
+        return ExactResult(
+            self.away, self.home, score, away_innings, home_innings,
+            p_extra_innings)
+
+#Host of each game of a best-of-n series, True for the team with home field
+#(the home team of the Series): 2-2-1 for five games, 2-3-2 for seven
+SERIES_HOSTS = {
+    1: (True,),
+    3: (True, True, True),
+    5: (True, True, False, False, True),
+    7: (True, True, False, False, False, True, True)}
+
+def sp_rotation(depth_chart, size=5, first=None):
+    ''' The size starting pitchers with the most TBF, optionally led by first
+'''
+    starting_pitchers = depth_chart.get('SP')
+    rotation = sorted(
+        [p for p in starting_pitchers\
+         if starting_pitchers[p].get('TBF') is not None],
+        key=lambda p: starting_pitchers[p]['TBF'], reverse=True)[:size]
+    if first is not None:
+        if first in rotation:
+            rotation.remove(first)
+        rotation = [first]+rotation[:size-1]
+    return rotation
+
+def series_odds(p_games, games):
+    ''' Exact final records of a best-of-games series
+
+p_games[i] is the probability that the team with home field wins game
+i+1 of the series. Returns {(wins, losses): probability} of that team
+over every way the series can end.
+'''
+    assert games%2 == 1 and len(p_games) >= games
+    needed = games//2+1
+    records, final = {(0, 0): 1.0}, {}
+    for p in p_games[:games]:
+        played = {}
+        for (wins, losses), probability in records.items():
+            for record, p_record in (((wins+1, losses), p),
+                                     ((wins, losses+1), 1-p)):
+                target = final if needed in record else played
+                target[record] = target.get(record, 0)+probability*p_record
+        records = played
+    return final
+
+def series_records(results):
+    ''' Share of each final record in a list of SeriesResult, as series_odds
+'''
+    counts = collections.Counter(
+        [(result.home_wins, result.away_wins) for result in results])
+    return {record: count/len(results) for record, count in counts.items()}
+
+def series_report(away_team, home_team, records):
+    ''' Printable series odds from {(home wins, away wins): probability}
+'''
+    needed = max([max(record) for record in records])
+    lines = []
+    for team, side in ((away_team, 1), (home_team, 0)):
+        p_team = sum([p for record, p in records.items()\
+                      if record[side] == needed])
+        lines.append(f'{team}: {p_team:.2%}')
+        for record in sorted(records):
+            if record[side] == needed:
+                lines.append(f'    in {sum(record)}: {records[record]:.2%}')
+    return '\n'.join(lines)
+
+class SeriesResult:
+    ''' Games of one best-of-n series, from the side of its home team
+'''
+    def __init__(self, away_team, home_team, games, results):
+        self.away, self.home = away_team, home_team
+        self.games = games
+        self.results = results
+        self.home_wins = sum([r.winner == home_team for r in results])
+        self.away_wins = len(results)-self.home_wins
+
+    def __len__(self):
+        return len(self.results)
+
+    @property
+    def winner(self):
+        return self.home if self.home_wins > self.away_wins else self.away
+
+    def __repr__(self):
+        return (f'SeriesResult({self.winner} in {len(self)}, '
+                f'{self.away} {self.away_wins}-{self.home_wins} '
+                f'{self.home})')
+
+class Series:
+    ''' Best-of-n series between two teams, stopped once it is clinched
+
+home_team has home field: game i is hosted as SERIES_HOSTS[games][i].
+Each team's starter of game i is rotation[i % len(rotation)], so a
+rotation of one pitcher starts every game. One Simulation is built per
+distinct host and pitching matchup and reused for every series played;
+their matchup tables are shared through tables as in Simulation.
+'''
+    def __init__(self, away_team, home_team, away_roster, home_roster,
+                 away_lineup, home_lineup, away_rotation, home_rotation,
+                 games=7, *, xrunner=True, rng=None, tables=None):
+        assert games in SERIES_HOSTS
+        tables = tables if tables is not None else {}
+        self.away, self.home = away_team, home_team
+        self.games = games
+        self.rng = rng if rng is not None else random.Random()
+        self.simulations, simulations = [], {}
+        for i, hosted in enumerate(SERIES_HOSTS[games]):
+            away_sp = away_rotation[i%len(away_rotation)]
+            home_sp = home_rotation[i%len(home_rotation)]
+            key = (hosted, away_sp, home_sp)
+            if key not in simulations:
+                if hosted:
+                    simulations[key] = Simulation(
+                        away_team, home_team, away_roster, home_roster,
+                        away_lineup, home_lineup, away_sp, home_sp,
+                        xrunner=xrunner, rng=self.rng, tables=tables)
+                else:
+                    simulations[key] = Simulation(
+                        home_team, away_team, home_roster, away_roster,
+                        home_lineup, away_lineup, home_sp, away_sp,
+                        xrunner=xrunner, rng=self.rng, tables=tables)
+            self.simulations.append(simulations[key])
+
+    def simulate_series(self):
+        needed = self.games//2+1
+        results, wins = [], {self.away: 0, self.home: 0}
+        for simulation in self.simulations:
+            simulation.rng = self.rng
+            result = simulation.simulate_game()
+            results.append(result)
+            wins[result.winner] += 1
+            if wins[result.winner] == needed:
+                break
+        return SeriesResult(self.away, self.home, self.games, results)
+
+    def win_probabilities(self, **kwargs):
+        ''' Exact probability of the home field team winning each game
+'''
+        solved = {}
+        p_games = []
+        for simulation in self.simulations:
+            if id(simulation) not in solved:
+                result = MarkovSolver.from_simulation(
+                    simulation, **kwargs).solve()
+                p_home = result.p_home_win\
+                         /(result.p_home_win+result.p_away_win)
+                solved[id(simulation)] = p_home\
+                                         if simulation.home == self.home\
+                                         else 1-p_home
+            p_games.append(solved[id(simulation)])
+        return p_games
+
+    def odds(self, **kwargs):
+        ''' Exact final records of the series without simulating a game
+'''
+        return series_odds(self.win_probabilities(**kwargs), self.games)
+
+#Milliseconds between redraws of the GameViewer window
+FRAME_MS = 33
+#Milliseconds a finished game stays up before the next one auto-advances
+ADVANCE_MS = 1000
+
+class GameViewer:
+    ''' One Tkinter line score window that plays any number of games
+
+Each call to play simulates a game on a worker thread that never touches
+Tk. After every plate appearance it puts a snapshot of the line score on
+a queue, and the Tk thread drains the queue every FRAME_MS milliseconds
+through root.after, drawing only the newest snapshot, so the simulation
+never waits on the display. In fast_forward mode, or once Fast Forward
+is clicked, no snapshots are posted and only the final line score is
+drawn.
+
+Between games the line score is reset in place and a tally of every
+game played so far is shown under it. The next game starts when Next is
+clicked or, with Auto checked, ADVANCE_MS after the last one ended. The
+matchup tables are shared by all the games, so they are only built for
+each new pitcher.
+'''
+    def __init__(self, *, fast_forward=False, auto_advance=False):
+        self.fast_forward = fast_forward
+        self.updates = queue.Queue()
+        self.tables = {}
+        self.closed = False
+        self.wins = collections.Counter()
+        self.runs = collections.Counter()
+        self.games = 0
+
+        self.root = tkinter.Tk()
+        self.root.title('MLB Simulation')
+        self.root.protocol('WM_DELETE_WINDOW', self.close)
+        self.ls_labels = {
+            'Head': [tkinter.StringVar(self.root, value='')],
+            'Body': [], 'Tail': [tkinter.StringVar(self.root, value=c)\
+                                 for c in ('R', 'H', 'E')]}
+        self.ls_away = {
+            'Head': [tkinter.StringVar(self.root, value='')],
+            'Body': [], 'Tail': [tkinter.StringVar(self.root, value='0')\
+                                 for c in ('R', 'H', 'E')]}
+        self.ls_home = {
+            'Head': [tkinter.StringVar(self.root, value='')],
+            'Body': [], 'Tail': [tkinter.StringVar(self.root, value='0')\
+                                 for c in ('R', 'H', 'E')]}
+        self.line_score = [self.ls_labels, self.ls_away, self.ls_home]
+        self.ls_widgets = []
+        for _ in range(9):
+            self.add_inning(grid=False)
+        self.tally = tkinter.StringVar(self.root, value='')
+        self.tally_label = tkinter.Label(
+            self.root, textvariable=self.tally, anchor='w')
+        self.fast_forward_button = tkinter.Button(
+            self.root, text='Fast Forward', command=self.skip)
+        self.auto_advance = tkinter.BooleanVar(
+            self.root, value=auto_advance)
+        self.auto_advance_button = tkinter.Checkbutton(
+            self.root, text='Auto', variable=self.auto_advance)
+        self.next_button = tkinter.Button(
+            self.root, text='Next', command=self.root.quit)
+
+    def play(self, away_team, home_team, away_roster, home_roster,
+             away_lineup, home_lineup, away_sp, home_sp):
+        ''' Show one game and return its GameResult once the user moves on
+
+Returns None if the window was closed.
+'''
+        if self.closed:
+            return None
+        self.simulation = Simulation(
+            away_team, home_team, away_roster, home_roster,
+            away_lineup, home_lineup, away_sp, home_sp,
+            sink=TextSink(), box_score=True, callback=self.post,
+            tables=self.tables)
+        self.result = None
+        self.reset(away_team, home_team)
+        threading.Thread(target=self.simulate_game, daemon=True).start()
+        self.root.after(FRAME_MS, self.drain)
+        self.root.mainloop()
+        return None if self.closed else self.result
+
+    def reset(self, away_team, home_team):
+        ''' Clear the line score for a new game between two teams
+'''
+        for ls in self.line_score:
+            del ls['Body'][9:]
+        for i, variable in enumerate(self.ls_labels['Body'], 1):
+            variable.set(i)
+        for ls, team in ((self.ls_away, away_team),
+                         (self.ls_home, home_team)):
+            ls['Head'][0].set(team)
+            for variable in ls['Body']:
+                variable.set('')
+            for variable in ls['Tail']:
+                variable.set('0')
+        self.grid_line_score()
+        self.next_button.grid_forget()
+        if not self.fast_forward:
+            self.fast_forward_button.grid(row=3, column=1)
+        self.auto_advance_button.grid(row=3, column=2)
+        self.tally_label.grid(row=4, column=0, columnspan=13, sticky='w')
+
+    def grid_line_score(self):
+        for widget in self.ls_widgets:
+            widget.destroy()
+        self.ls_widgets = []
+        for r, row in enumerate(self.line_score):
+            values = []
+            values.extend(list(row.values())[0])
+            values.extend(list(row.values())[1])
+            values.extend(list(row.values())[2])
+            for c, item in enumerate(values):
+                w = 30 if item in row['Head'] else 10
+                label = tkinter.Label(
+                    self.root, textvariable=item, relief="sunken",
+                    width=w
+                    )
+                label.grid(row=r, column=c)
+                self.ls_widgets.append(label)
+
+    def add_inning(self, grid=True):
+        inning = len(self.ls_labels['Body'])+1
+        self.ls_labels['Body'].append(
+            tkinter.StringVar(self.root, value=inning))
+        self.ls_away['Body'].append(tkinter.StringVar(self.root, value=''))
+        self.ls_home['Body'].append(tkinter.StringVar(self.root, value=''))
+        if grid:
+            self.grid_line_score()
+
+    def post(self, simulation):
+        ''' Queue a snapshot of the line score (simulation thread)
+'''
+        if self.fast_forward and not simulation.gameover:
+            return
+        self.updates.put((
+            tuple(simulation.away_line), tuple(simulation.home_line),
+            simulation.away_score, simulation.home_score,
+            simulation.away_hits, simulation.home_hits))
+
+    def skip(self):
+        self.fast_forward = True
+        self.fast_forward_button.grid_forget()
+
+    def drain(self):
+        ''' Draw the newest queued snapshot, then check again a frame later
+'''
+        if self.closed:
+            return
+        snapshot = None
+        while not self.updates.empty():
+            snapshot = self.updates.get_nowait()
+        if snapshot is not None:
+            self.update(*snapshot)
+        if self.result is not None and self.updates.empty():
+            self.finish()
+            return
+        self.root.after(FRAME_MS, self.drain)
+
+    def finish(self):
+        ''' Add the game just shown to the tally and wait for the next one
+'''
+        result = self.result
+        self.games += 1
+        self.wins[result.winner] += 1
+        self.runs[result.away] += result.away_score
+        self.runs[result.home] += result.home_score
+        teams = sorted(self.runs)
+        self.tally.set(
+            f'After {self.games} games: '
+            +', '.join([f'{team} {self.wins[team]} wins '
+                        f'({self.runs[team]/self.games:.2f} runs)'\
+                        for team in teams]))
+        self.fast_forward_button.grid_forget()
+        if self.auto_advance.get():
+            self.root.after(ADVANCE_MS, self.advance)
+        else:
+            self.next_button.grid(row=3, column=0)
+
+    def advance(self):
+        #Auto may have been unchecked while waiting
+        if self.auto_advance.get():
+            self.root.quit()
+        else:
+            self.next_button.grid(row=3, column=0)
+
+    def update(self, away_line, home_line, away_score, home_score,
+               away_hits, home_hits):
+        ''' Copy a line score snapshot to the Tkinter variables
+'''
+        for ls, line, score, hits in (
+            (self.ls_away, away_line, away_score, away_hits),
+            (self.ls_home, home_line, home_score, home_hits)):
+            for i, runs in enumerate(line):
+                if i >= len(ls['Body']):
+                    self.add_inning()
+                ls['Body'][i].set('X' if runs is None else runs)
+            ls['Tail'][0].set(score)
+            ls['Tail'][1].set(hits)
+
+    def simulate_game(self):
+        ''' Play the game (simulation thread)
+'''
+        result = self.simulation.simulate_game()
+        self.away_box_score = self.simulation.box_score.lines(away=True)
+        self.home_box_score = self.simulation.box_score.lines()
+        self.result = result
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.root.destroy()
+
+def setup_simulation(away_team, home_team, *, rng=random, directory='',
+                     **kwargs):
+    ''' Load both rosters and pick lineups and starters for a Simulation
+'''
+    teams = Teams(directory)
+    assert away_team in teams.teams and home_team in teams.teams
+    teams.away_team, teams.home_team = away_team, home_team
+    teams.compile_rosters()
+    away_lineup = batting_order(random_lineup(teams.away_depth_chart, rng))
+    home_lineup = batting_order(random_lineup(teams.home_depth_chart, rng))
+    away_sp = random_sp(teams.away_depth_chart, rng)
+    home_sp = random_sp(teams.home_depth_chart, rng)
+    return Simulation(
+        away_team, home_team, teams.away_roster, teams.home_roster,
+        away_lineup, home_lineup, away_sp, home_sp, rng=rng, **kwargs)
+
+def setup_series(away_team, home_team, games, *, rotation=5, rng=random,
+                 directory='', **kwargs):
+    ''' Load both rosters and pick lineups and rotations for a Series
+
+Each rotation is led by a starter picked as in setup_simulation and
+filled out by sp_rotation; a rotation of 1 starts him in every game.
+'''
+    teams = Teams(directory)
+    assert away_team in teams.teams and home_team in teams.teams
+    teams.away_team, teams.home_team = away_team, home_team
+    teams.compile_rosters()
+    away_lineup = batting_order(random_lineup(teams.away_depth_chart, rng))
+    home_lineup = batting_order(random_lineup(teams.home_depth_chart, rng))
+    away_rotation = sp_rotation(
+        teams.away_depth_chart, rotation,
+        random_sp(teams.away_depth_chart, rng))
+    home_rotation = sp_rotation(
+        teams.home_depth_chart, rotation,
+        random_sp(teams.home_depth_chart, rng))
+    return Series(
+        away_team, home_team, teams.away_roster, teams.home_roster,
+        away_lineup, home_lineup, away_rotation, home_rotation, games,
+        rng=rng, **kwargs)
+
+def stream_seed(seed, index):
+    ''' Seed of the index-th independent random stream of a master seed
+'''
+    digest = hashlib.sha256(f'{seed}:{index}'.encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+#Games simulated per BatchSimulation.simulate call when only the summary
+#of a batch run is kept
+SUMMARY_BLOCK = 2**18
+
+def run_chunk(simulation, n, seed, mode='game', summary=False):
+    ''' Simulate n games of a Simulation's matchup from one random stream
+
+With summary the games are added to a GameStats as they finish instead
+of being returned, so memory does not grow with n. If the Simulation
+keeps a box score, a fresh one counts the chunk's games in the GameStats.
+'''
+    if mode == 'batch':
+        batch = BatchSimulation.from_simulation(simulation, seed=seed)
+        if not summary:
+            return batch.simulate(n)
+        stats = GameStats(simulation.away, simulation.home)
+        for start in range(0, n, SUMMARY_BLOCK):
+            stats.add_batch(batch.simulate(min(SUMMARY_BLOCK, n-start)))
+        return stats
+    simulation.rng = random.Random(seed)
+    if not summary:
+        return [simulation.simulate_game() for _ in range(n)]
+    stats = GameStats(simulation.away, simulation.home)
+    if simulation.box_score is not None:
+        simulation.box_score = BoxScore.from_simulation(simulation)
+        stats.box_score = simulation.box_score
+    for _ in range(n):
+        stats.add(simulation.simulate_game())
+    return stats
+
+def merge_results(chunks):
+    ''' Concatenate the results of run_chunk in chunk order
+'''
+    if chunks and isinstance(chunks[0], GameStats):
+        stats = GameStats(chunks[0].away, chunks[0].home)
+        for chunk in chunks:
+            stats.merge(chunk)
+        return stats
+    if chunks and isinstance(chunks[0], BatchResult):
+        return BatchResult(
+            chunks[0].away, chunks[0].home,
+            np.concatenate([chunk.away_score for chunk in chunks]),
+            np.concatenate([chunk.home_score for chunk in chunks]),
+            np.concatenate([chunk.innings for chunk in chunks]))
+    return [result for chunk in chunks for result in chunk]
+
+#Simulation of the current worker process, built once by init_worker
+worker_state = {}
+
+def init_worker(settings):
+    teams = Teams(settings['directory'])
+    teams.away_team, teams.home_team = settings['away'], settings['home']
+    teams.compile_rosters()
+    worker_state['simulation'] = Simulation(
+        teams.away_team, teams.home_team,
+        teams.away_roster, teams.home_roster,
+        settings['away_lineup'], settings['home_lineup'],
+        settings['away_sp'], settings['home_sp'],
+        xrunner=settings['xrunner'], box_score=settings['box_score'])
+
+def run_worker_chunk(task):
+    n, seed, mode, summary = task
+    return run_chunk(worker_state['simulation'], n, seed, mode, summary)
+
+def worker_settings(simulation, directory=''):
+    ''' What init_worker needs to rebuild a Simulation in a worker process
+'''
+    return {
+        'directory': directory,
+        'away': simulation.away, 'home': simulation.home,
+        'away_lineup': simulation.away_lineup,
+        'home_lineup': simulation.home_lineup,
+        'away_sp': simulation.away_pitcher,
+        'home_sp': simulation.home_pitcher,
+        'xrunner': simulation.xrunner,
+        'box_score': simulation.box_score is not None}
+
+def run_parallel(simulation, reps, *, workers, seed, mode='game',
+                 summary=False, directory=''):
+    ''' Spread reps of a Simulation's matchup over a process pool
+
+The reps are split into one chunk per worker and chunk i is simulated
+from stream_seed(seed, i), so the merged results only depend on the
+master seed and the worker count. Each worker loads the rosters once.
+'''
+    settings = worker_settings(simulation, directory)
+    tasks = [(reps//workers+(i < reps%workers), stream_seed(seed, i), mode,
+              summary) for i in range(workers)]
+    with concurrent.futures.ProcessPoolExecutor(
+        workers, initializer=init_worker, initargs=(settings,)) as pool:
+        return merge_results(list(pool.map(run_worker_chunk, tasks)))
+
+#Games per random stream of run_checkpointed, so also the most games
+#replay_game plays to reach any one of them
+CHECKPOINT_BLOCK = 10000
+
+def checkpoint_key(simulation, reps, seed, mode, block):
+    ''' What a checkpoint must match to be resumed by a run
+'''
+    return (simulation.away, simulation.home,
+            simulation.away_lineup, simulation.home_lineup,
+            simulation.away_pitcher, simulation.home_pitcher,
+            simulation.xrunner, simulation.box_score is not None,
+            reps, seed, mode, block)
+
+def read_checkpoint(path, key):
+    ''' Blocks done and GameStats of a checkpoint of the run key, or None
+'''
+    try:
+        with open(path, 'rb') as file:
+            checkpoint = pickle.load(file)
+        if checkpoint['key'] == key:
+            return checkpoint['blocks'], checkpoint['stats']
+    except (OSError, EOFError, KeyError, ValueError,
+            pickle.UnpicklingError):
+        pass
+    return None
+
+def write_checkpoint(path, key, blocks, stats):
+    with open(f'{path}.tmp', 'wb') as file:
+        pickle.dump({'key': key, 'blocks': blocks, 'stats': stats}, file,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f'{path}.tmp', path)
+
+def run_checkpointed(simulation, reps, seed, path, *, mode='game',
+                     block=CHECKPOINT_BLOCK, workers=1, directory=''):
+    ''' Simulate reps games into a GameStats that is saved after each block
+
+Block k of block games is simulated from stream_seed(seed, k) like a
+chunk of run_parallel, and the GameStats so far is written to path
+(through a temporary file, so a crash never leaves it half written). If
+path already holds a checkpoint of the same run, the run resumes after
+its last block and ends with the same stats as an uninterrupted one.
+In 'game' mode, game i of the run can be played again with
+replay_game(simulation, seed, i, block=block).
+'''
+    assert mode in ('game', 'batch')
+    key = checkpoint_key(simulation, reps, seed, mode, block)
+    checkpoint = read_checkpoint(path, key)
+    if checkpoint is None:
+        done, stats = 0, GameStats(simulation.away, simulation.home)
+    else:
+        done, stats = checkpoint
+        logging.debug(f'Resuming {path} after {stats.games} games')
+    tasks = [(min(block, reps-start), stream_seed(seed, k), mode, True)\
+             for k, start in enumerate(range(0, reps, block))][done:]
+    if workers > 1:
+        pool = concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=init_worker,
+            initargs=(worker_settings(simulation, directory),))
+        chunks = pool.map(run_worker_chunk, tasks)
+    else:
+        pool = None
+        chunks = (run_chunk(simulation, *task) for task in tasks)
+    try:
+        for chunk in chunks:
+            stats.merge(chunk)
+            done += 1
+            write_checkpoint(path, key, done, stats)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return stats
+
+def replay_game(simulation, seed, index, *, block=CHECKPOINT_BLOCK):
+    ''' Play game index (from 0) of a 'game' mode run of seed again
+
+The run is one of run_checkpointed with the same block, or of
+run_chunk(simulation, n, stream_seed(seed, 0)) when index < block. The
+games before it in its block are played quietly to bring self.rng to
+where it was, then the game is played with the Simulation's sink,
+callback and box score, numbered index+1, and its GameResult returned.
+'''
+    simulation.rng = random.Random(stream_seed(seed, index//block))
+    quiet = simulation.sink, simulation.callback, simulation.box_score
+    simulation.sink = simulation.callback = simulation.box_score = None
+    try:
+        for _ in range(index%block):
+            simulation.simulate_game()
+    finally:
+        simulation.sink, simulation.callback, simulation.box_score = quiet
+    simulation.game = index
+    return simulation.simulate_game()
+
+def simulate(away_team, home_team, reps, *, mode='game', seed=None,
+             workers=1, summary=False, box_score=False, sink=None,
+             series=1, rotation=5, directory=''):
+    ''' Simulate reps games headlessly
+
+In 'game' mode every game is played out by Simulation and a list of
+GameResult is returned; 'batch' mode runs them in lockstep with
+BatchSimulation and returns a BatchResult. 'exact' ignores reps and
+returns the ExactResult of MarkovSolver. With more than one worker the
+reps are spread over a process pool by run_parallel. With summary,
+'game' and 'batch' return a GameStats of the reps instead; in 'game'
+mode box_score also sums the players' stats in its box_score. The sink
+receives the play-by-play of a single process run; worker processes play
+quietly.
+
+With series above 1, each rep is a best-of-series Series in a single
+process: 'game' returns a list of SeriesResult and 'exact' the series
+odds of Series.odds.
+'''
+    assert mode in ('game', 'batch', 'exact')
+    assert not box_score or (summary and mode == 'game')
+    if seed is None:
+        seed = random.randrange(2**32)
+    if series > 1:
+        assert mode in ('game', 'exact') and not summary
+        series = setup_series(
+            away_team, home_team, series, rotation=rotation,
+            rng=random.Random(seed), directory=directory)
+        if mode == 'exact':
+            return series.odds()
+        series.rng = random.Random(stream_seed(seed, 0))
+        return [series.simulate_series() for _ in range(reps)]
+    simulation = setup_simulation(
+        away_team, home_team, rng=random.Random(seed),
+        directory=directory, sink=sink, box_score=box_score)
+    if mode == 'exact':
+        return MarkovSolver.from_simulation(simulation).solve()
+    if workers > 1:
+        return run_parallel(
+            simulation, reps, workers=workers, seed=seed, mode=mode,
+            summary=summary, directory=directory)
+    return run_chunk(
+        simulation, reps, stream_seed(seed, 0), mode, summary)
+
+class PrecisionResult:
+    ''' Away team's win probability from simulate_to_precision
+
+half_width is the half width of the z interval reached after stats.games
+games, and effective_games the number of plain games that would have
+been needed for it.
+'''
+    def __init__(self, away_team, home_team, p_away_win, half_width, stats,
+                 z=1.96):
+        self.away, self.home = away_team, home_team
+        self.p_away_win, self.half_width = p_away_win, half_width
+        self.stats = stats
+        self.z = z
+
+    @property
+    def effective_games(self):
+        p = self.p_away_win
+        return p*(1-p)/(self.half_width/self.z)**2 if self.half_width\
+               else float('inf')
+
+    def __repr__(self):
+        return (f'PrecisionResult({self.away} {self.p_away_win:.4f} '
+                f'+/- {self.half_width:.4f}, {self.stats.games} games)')
+
+    def report(self):
+        return '\n'.join([
+            f'{self.away}: {self.p_away_win:.2%} +/- {self.half_width:.2%} '
+            f'to win after {self.stats.games} games (as precise as '
+            f'{self.effective_games:.0f} plain games)',
+            f'{self.home}: {1-self.p_away_win:.2%} to win']\
+            +self.stats.report(self.z).splitlines()[2:])
+
+def simulate_to_precision(simulation, precision=0.005, *, z=1.96,
+                          mode='game', seed=None, block=1000,
+                          max_games=10**7, antithetic=True, control=True):
+    ''' Simulate blocks of games until P(away win) is within +/-precision
+
+Games are added block games at a time until the z interval of the away
+team's win probability is no wider than precision either side, or
+max_games were played. Two variance reductions cut the games needed:
+
+antithetic ('game' mode) plays the games as Simulation.simulate_pair
+pairs and averages each pair into one sample.
+
+control uses both teams' runs as control variates, their exact
+expectations coming from MarkovSolver (so it needs NumPy): a game that
+scored more runs than expected for the away team is likelier won than
+the average, and ControlVariates corrects the win rate by how far the
+mean runs are from their exact values.
+'''
+    assert mode in ('game', 'batch')
+    if seed is None:
+        seed = random.randrange(2**32)
+    antithetic = antithetic and mode == 'game'
+    control = control and np is not None
+    means = ()
+    if control:
+        exact = MarkovSolver.from_simulation(simulation).solve()
+        means = (exact.away_expected, exact.home_expected)
+    estimator = ControlVariates(means) if np is not None\
+                else RunningMoments()
+    stats = GameStats(simulation.away, simulation.home)
+    if mode == 'batch':
+        batch = BatchSimulation.from_simulation(simulation, seed=seed)
+    else:
+        simulation.rng = random.Random(seed)
+    while True:
+        if mode == 'batch':
+            results = batch.simulate(block)
+            stats.add_batch(results)
+            y = results.away_score > results.home_score
+            x = np.column_stack([results.away_score, results.home_score])
+        else:
+            if antithetic:
+                pairs = [simulation.simulate_pair()\
+                         for _ in range(max(block//2, 1))]
+            else:
+                pairs = [[simulation.simulate_game()] for _ in range(block)]
+            y, x = [], []
+            for pair in pairs:
+                for result in pair:
+                    stats.add(result)
+                y.append(sum([result.away_score > result.home_score\
+                              for result in pair])/len(pair))
+                x.append([sum([result.away_score for result in pair]),
+                          sum([result.home_score for result in pair])])
+                x[-1] = [runs/len(pair) for runs in x[-1]]
+        if np is None:
+            for value in y:
+                estimator.add(value)
+            estimate, stderr = estimator.mean, estimator.stderr
+        else:
+            estimator.add_array(np.asarray(y), np.asarray(x) if control\
+                                else None)
+            estimate, stderr = estimator.estimate()
+        if z*stderr <= precision or stats.games >= max_games:
+            return PrecisionResult(
+                simulation.away, simulation.home, estimate, z*stderr, stats,
+                z)
+
+class OrderResult:
+    ''' Expected runs and win probability of a team batting one lineup
+'''
+    def __init__(self, team, lineup, runs, p_win):
+        self.team = team
+        self.lineup = lineup
+        self.runs, self.p_win = runs, p_win
+
+    def __repr__(self):
+        return (f'OrderResult({self.team} {self.runs:.3f} runs, '
+                f'{self.p_win:.4f})')
+
+def reorder_lineup(lineup, order):
+    ''' Lineup (or matchup table) batting the spots of lineup in order
+'''
+    return {spot: lineup[old] for spot, old in enumerate(order, 1)}
+
+@functools.cache
+def state_steps():
+    ''' Per event of EVENTS, the base-out state moves, runs and third outs
+
+Returns (moves[event, state, next state], runs[event, state],
+outs[event, state]) over the 24 base-out states outs*8+bases.
+'''
+    moves = np.zeros((len(EVENTS), 24, 24))
+    runs, outs = np.zeros((len(EVENTS), 24)), np.zeros((len(EVENTS), 24))
+    for event in range(len(EVENTS)):
+        for o in range(3):
+            for bases in range(8):
+                b, r, after = TRANSITIONS[event][o][bases]
+                runs[event, o*8+bases] = r
+                if after == 3:
+                    outs[event, o*8+bases] = 1
+                else:
+                    moves[event, o*8+bases, after*8+b] = 1
+    return moves, runs, outs
+
+def nine_inning_runs(matchups):
+    ''' Exact expected runs of a lineup in nine innings from spot 1 on
+
+Only expectations are needed, so a half inning is solved as one linear
+system over the (batting spot, base-out state) chain instead of for the
+run distributions of half_inning_table: row (s, state) of the solution
+holds the expected runs from there and the distribution of the next
+inning's leadoff spot.
+'''
+    events = np.clip(np.array(
+        [matchups[spot].events for spot in range(1, 10)]), 0, None)
+    events /= events.sum(axis=1, keepdims=True)
+    moves, runs, outs = state_steps()
+    spots = np.arange(9)
+    chain = np.zeros((9, 24, 9, 24))
+    chain[spots, :, (spots+1)%9] = np.einsum('se,eqr->sqr', events, moves)
+    gained = np.zeros((9, 24, 10))
+    gained[..., 0] = events@runs
+    gained[spots, :, 1+(spots+1)%9] = events@outs
+    solution = np.linalg.solve(
+        np.eye(9*24)-chain.reshape(9*24, 9*24), gained.reshape(9*24, 10))
+    runs, leadoff_table = solution[::24, 0], solution[::24, 1:]
+    leadoff = np.zeros(9)
+    leadoff[0] = 1
+    expected = 0
+    for _ in range(9):
+        expected += leadoff@runs
+        leadoff = leadoff@leadoff_table
+    return float(expected)
+
+def score_orders(simulation, orders, *, away=True, mode='exact',
+                 games=2000, seed=None, solve=False):
+    ''' (Expected runs, P(win)) of one team batting its spots in each order
+
+An order lists the team's lineup spots of the Simulation in their new
+order. 'exact' mode scores the nine-inning expected runs without a
+P(win), unless solve asks for the full MarkovSolver game. 'batch' mode
+plays games games of every order side by side in one BatchSimulation.
+'''
+    matchups = simulation.away_matchups if away\
+               else simulation.home_matchups
+    tables = [reorder_lineup(matchups, order) for order in orders]
+    opponent = simulation.home_matchups if away\
+               else simulation.away_matchups
+    if mode == 'exact' and not solve:
+        return [(nine_inning_runs(table), None) for table in tables]
+    if mode == 'exact':
+        scores = []
+        for table in tables:
+            result = MarkovSolver(
+                simulation.away, simulation.home,
+                table if away else opponent, opponent if away else table,
+                xrunner=simulation.xrunner).solve()
+            scores.append((result.away_expected, result.p_away_win) if away\
+                          else (result.home_expected, result.p_home_win))
+        return scores
+    batch = BatchSimulation(
+        simulation.away, simulation.home,
+        tables if away else [opponent]*len(tables),
+        [opponent]*len(tables) if away else tables,
+        xrunner=simulation.xrunner, seed=seed)
+    pairing = np.repeat(np.arange(len(tables)), games)
+    results = batch.simulate(len(pairing), pairing)
+    runs, allowed = (results.away_score, results.home_score) if away\
+                    else (results.home_score, results.away_score)
+    total = np.bincount(pairing, runs, len(tables))
+    wins = np.bincount(pairing, runs > allowed, len(tables))
+    return [(float(r/games), float(w/games)) for r, w in zip(total, wins)]
+
+def run_orders_task(task):
+    orders, kwargs = task
+    return score_orders(worker_state['simulation'], orders, **kwargs)
+
+class BattingOrderOptimizer:
+    ''' Search the batting orders of one team's starters for the most runs
+
+The search is a local search from the Simulation's order and restarts
+random ones: every step scores the orders one swap or one move of a
+batter away and moves to the best, until none is better or after
+max_steps steps. 'exact' mode scores an order by its exact nine-inning
+expected runs. 'batch' mode races the orders of a step by successive
+halving: all of them play games games side by side in one
+BatchSimulation, the better half and the current order are kept and
+the games are doubled until one challenger is left, which the search
+moves to if it beat the current order in the last round.
+
+optimize scores the best orders found by the full game, exact or from
+final_games games, and ranks them by expected runs or, with objective
+'win', by win probability. With workers above 1 the orders of every
+step are scored by a process pool that loads the rosters once per
+worker. stop, called from another thread, ends the search after the
+step in progress and optimize ranks the orders found so far.
+'''
+    def __init__(self, simulation, *, away=True, mode='exact',
+                 objective='runs', games=200, final_games=20000,
+                 restarts=2, max_steps=10, workers=1, seed=None,
+                 directory=''):
+        assert mode in ('exact', 'batch')
+        assert objective in ('runs', 'win')
+        self.simulation = simulation
+        self.away = away
+        self.team = simulation.away if away else simulation.home
+        self.lineup = simulation.away_lineup if away\
+                      else simulation.home_lineup
+        self.mode, self.objective = mode, objective
+        self.games, self.final_games = games, final_games
+        self.restarts, self.max_steps = restarts, max_steps
+        self.workers = workers
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+        self.directory = directory
+        self.pool = None
+        #Steps taken so far, and set by stop to end the search early
+        self.steps = 0
+        self.stopped = threading.Event()
+        #Latest (runs, P(win)) of every order scored
+        self.scores = {}
+        #Scores of the last round of every 'batch' step, which all come
+        #from the same number of games, unlike the losers' early scores
+        self.finalists = {}
+
+    def value(self, score):
+        runs, p_win = score
+        return p_win if self.objective == 'win' and p_win is not None\
+               else runs
+
+    def evaluate(self, orders, **kwargs):
+        ''' Scores of orders, split between the pool's workers if any
+
+In 'batch' mode share i of the orders plays from stream_seed(seed, i).
+'''
+        kwargs = dict(kwargs, away=self.away, mode=self.mode)
+        if self.workers == 1:
+            return score_orders(self.simulation, orders, **dict(
+                kwargs, seed=stream_seed(kwargs.get('seed'), 0)))
+        if self.pool is None:
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                self.workers, initializer=init_worker,
+                initargs=(worker_settings(self.simulation, self.directory),))
+        tasks = [(orders[i::self.workers],
+                  dict(kwargs, seed=stream_seed(kwargs.get('seed'), i)))\
+                 for i in range(min(self.workers, len(orders)))]
+        shares = list(self.pool.map(run_orders_task, tasks))
+        scores = [None]*len(orders)
+        for i, share in enumerate(shares):
+            scores[i::self.workers] = share
+        return scores
+
+    def neighbours(self, order):
+        ''' Orders one swap of two spots or one move of a batter away
+'''
+        found = []
+        for i, j in itertools.combinations(range(9), 2):
+            swapped = list(order)
+            swapped[i], swapped[j] = swapped[j], swapped[i]
+            found.append(tuple(swapped))
+        for i in range(9):
+            for j in range(9):
+                #Moving a batter by one spot is a swap
+                if abs(i-j) > 1:
+                    moved = list(order)
+                    moved.insert(j, moved.pop(i))
+                    found.append(tuple(moved))
+        return list(dict.fromkeys(found))
+
+    def step(self, order, index):
+        ''' Best of order and its neighbours, order itself on a tie
+'''
+        challengers = self.neighbours(order)
+        if self.mode == 'exact':
+            new = [c for c in [order]+challengers if c not in self.scores]
+            self.scores.update(zip(new, self.evaluate(new)))
+            return max([order]+challengers, key=lambda candidate:\
+                       self.value(self.scores[candidate]))
+        games, seed = self.games, stream_seed(self.seed, index)
+        while True:
+            scores = self.evaluate(
+                [order]+challengers, games=games, seed=seed)
+            self.scores.update(zip([order]+challengers, scores))
+            if len(challengers) == 1:
+                self.finalists.update(zip([order]+challengers, scores))
+                break
+            ranked = sorted(challengers, key=lambda candidate: -self.value(
+                self.scores[candidate]))
+            challengers = ranked[:(len(ranked)+1)//2]
+            games *= 2
+        best = challengers[0]
+        if self.value(self.scores[best]) > self.value(self.scores[order]):
+            return best
+        return order
+
+    def optimize(self, top=5):
+        ''' Search and return the OrderResult of the top orders, best first
+'''
+        starts = [tuple(range(1, 10))]+[
+            tuple(self.rng.sample(range(1, 10), 9))\
+            for _ in range(self.restarts)]
+        index = 0
+        try:
+            for order in starts:
+                for _ in range(self.max_steps):
+                    best = self.step(order, index)
+                    index += 1
+                    self.steps = index
+                    if best == order or self.stopped.is_set():
+                        break
+                    order = best
+                if self.stopped.is_set():
+                    break
+            #The nine-inning runs only shortlist the orders to win with
+            shortlist = top*4 if self.objective == 'win' else top
+            scores = self.finalists if self.mode == 'batch' else self.scores
+            ranked = sorted(scores, key=lambda order: -self.value(
+                scores[order]))[:shortlist]
+            final = self.evaluate(
+                ranked, solve=True, games=self.final_games,
+                seed=stream_seed(self.seed, index))
+        finally:
+            self.close()
+        results = [OrderResult(
+            self.team, reorder_lineup(self.lineup, order), runs, p_win)\
+                   for order, (runs, p_win) in zip(ranked, final)]
+        return sorted(results, key=lambda result: -(
+            result.p_win if self.objective == 'win' else result.runs))[:top]
+
+    def stop(self):
+        ''' End the search after the current step (from any thread)
+'''
+        self.stopped.set()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+DIVISIONS = {
+    'AL East': ('Blue Jays', 'Orioles', 'Rays', 'Red Sox', 'Yankees'),
+    'AL Central': ('Indians', 'Royals', 'Tigers', 'Twins', 'White Sox'),
+    'AL West': ('Angels', 'Astros', 'Athletics', 'Mariners', 'Rangers'),
+    'NL East': ('Braves', 'Marlins', 'Mets', 'Nationals', 'Phillies'),
+    'NL Central': ('Brewers', 'Cardinals', 'Cubs', 'Pirates', 'Reds'),
+    'NL West': ('Diamondbacks', 'Dodgers', 'Giants', 'Padres', 'Rockies')}
+
+#Interleague rivals (AL, NL), who meet four times a season instead of three
+RIVALS = (
+    ('Yankees', 'Mets'), ('Red Sox', 'Braves'), ('Blue Jays', 'Phillies'),
+    ('Orioles', 'Nationals'), ('Rays', 'Marlins'), ('White Sox', 'Cubs'),
+    ('Indians', 'Reds'), ('Tigers', 'Pirates'), ('Twins', 'Brewers'),
+    ('Royals', 'Cardinals'), ('Angels', 'Dodgers'), ('Athletics', 'Giants'),
+    ('Mariners', 'Padres'), ('Astros', 'Rockies'),
+    ('Rangers', 'Diamondbacks'))
+
+def season_schedule(rng=random):
+    ''' A balanced 162-game schedule of (away, home) games in a random order
+
+Every team plays 13 games against each division rival, 7 against four of
+the other teams of its league and 6 against the rest, 4 against its
+interleague rival and 3 against every other team of the other league.
+The odd series are split so that every team has 81 home games.
+'''
+    #(host, visitor, games), the host having the extra home game if odd
+    meetings = []
+    for league in ('AL', 'NL'):
+        divisions = [DIVISIONS[f'{league} {division}']\
+                     for division in ('East', 'Central', 'West')]
+        for division in divisions:
+            for i, team in enumerate(division):
+                for step in (1, 2):
+                    meetings.append((team, division[(i+step)%5], 13))
+        for first, second in ((0, 1), (0, 2), (1, 2)):
+            for i, team in enumerate(divisions[first]):
+                for j, opponent in enumerate(divisions[second]):
+                    if j == i:
+                        meetings.append((team, opponent, 7))
+                    elif j == (i+1)%5:
+                        meetings.append((opponent, team, 7))
+                    else:
+                        meetings.append((team, opponent, 6))
+    for a, (al_team, _) in enumerate(RIVALS):
+        for b, (_, nl_team) in enumerate(RIVALS):
+            if a == b:
+                meetings.append((al_team, nl_team, 4))
+            elif (b-a)%15 <= 7:
+                meetings.append((al_team, nl_team, 3))
+            else:
+                meetings.append((nl_team, al_team, 3))
+    schedule = []
+    for host, visitor, games in meetings:
+        schedule.extend([(visitor, host)]*((games+1)//2))
+        schedule.extend([(host, visitor)]*(games//2))
+    rng.shuffle(schedule)
+    return schedule
+
+def load_schedule(path):
+    ''' Read a schedule of (away, home) games from a CSV with Away and Home
+columns, in the order they are played
+'''
+    with open(path, newline='') as file:
+        return [(row['Away'], row['Home']) for row in csv.DictReader(file)]
+
+def random_rotation(depth_chart, size=5, rng=random):
+    ''' Draw up to size distinct starting pitchers weighted by TBF
+'''
+    starters = {player: data for player, data in depth_chart.get('SP').items()\
+                if data.get('TBF')}
+    rotation = []
+    while starters and len(rotation) < size:
+        pitcher = random_sp({'SP': starters}, rng)
+        rotation.append(pitcher)
+        del starters[pitcher]
+    return rotation
+
+class League:
+    ''' Every team's roster, lineup and rotation, loaded once for seasons
+
+Each team bats one lineup drawn by random_lineup and starts a rotation
+drawn by random_rotation, so the same rng gives the same League. The
+Simulations, BatchSimulations and playoff Series of any number of
+seasons are cached here and share one dict of matchup tables.
+'''
+    def __init__(self, directory='', *, rotation=5, rng=random,
+                 xrunner=True):
+        self.teams = Teams(directory).teams
+        self.xrunner = xrunner
+        self.rosters = {team: {} for team in self.teams}
+        self.depth_charts = {team: {} for team in self.teams}
+        for position in list(BATTING)+list(PITCHING):
+            for team in self.teams:
+                self.depth_charts[team].setdefault(position, {})
+            path = os.path.join(directory, f'{position}.csv')
+            schema = BATTING_SCHEMA if position in BATTING\
+                     else PITCHING_SCHEMA
+            leaderboard = load_leaderboard(path, schema)
+            for player_data in leaderboard.players(self.teams):
+                name, team = player_data['Name'], player_data['Team']
+                self.depth_charts[team][position].setdefault(
+                    name, player_data)
+                self.rosters[team].setdefault(name, player_data)
+        self.lineups = {
+            team: batting_order(random_lineup(self.depth_charts[team], rng))\
+            for team in self.teams}
+        self.rotations = {
+            team: random_rotation(self.depth_charts[team], rotation, rng)\
+            for team in self.teams}
+        self.tables = {}
+        self.simulations = {}
+        self.batches = {}
+        self.series = {}
+
+    def starters(self, schedule):
+        ''' (away, home, away_sp, home_sp) of every game of a schedule, each
+team's starters taking turns through its rotation
+'''
+        played = dict.fromkeys(self.teams, 0)
+        games = []
+        for away, home in schedule:
+            away_rotation = self.rotations[away]
+            home_rotation = self.rotations[home]
+            games.append((
+                away, home,
+                away_rotation[played[away]%len(away_rotation)],
+                home_rotation[played[home]%len(home_rotation)]))
+            played[away] += 1
+            played[home] += 1
+        return games
+
+    def simulation(self, away_team, home_team, away_sp, home_sp):
+        key = (away_team, home_team, away_sp, home_sp)
+        if key not in self.simulations:
+            self.simulations[key] = Simulation(
+                away_team, home_team,
+                self.rosters[away_team], self.rosters[home_team],
+                self.lineups[away_team], self.lineups[home_team],
+                away_sp, home_sp, xrunner=self.xrunner, tables=self.tables)
+        return self.simulations[key]
+
+    def batch(self, games):
+        ''' One BatchSimulation of a list of (away, home, away_sp, home_sp)
+games side by side, pairing i being games[i]
+'''
+        key = tuple(games)
+        if key not in self.batches:
+            simulations = [self.simulation(*game) for game in games]
+            self.batches[key] = BatchSimulation(
+                None, None,
+                [simulation.away_matchups for simulation in simulations],
+                [simulation.home_matchups for simulation in simulations],
+                xrunner=self.xrunner)
+        return self.batches[key]
+
+    def playoff_series(self, away_team, home_team, games, rng):
+        ''' Winner of a best-of-games series, home_team having home field
+'''
+        key = (away_team, home_team, games)
+        if key not in self.series:
+            self.series[key] = Series(
+                away_team, home_team,
+                self.rosters[away_team], self.rosters[home_team],
+                self.lineups[away_team], self.lineups[home_team],
+                self.rotations[away_team], self.rotations[home_team],
+                games, xrunner=self.xrunner, tables=self.tables)
+        self.series[key].rng = rng
+        return self.series[key].simulate_series().winner
+
+class SeasonStats:
+    ''' Standings and playoff results of any number of simulated seasons
+
+For every team: a histogram and RunningMoments of its wins, and the
+number of seasons in which it reached each of outcomes. As with
+GameStats nothing is kept per season, and stats of separate runs
+combine with merge.
+'''
+    outcomes = ('Division', 'Playoffs', 'Bye', 'Pennant', 'Title')
+
+    def __init__(self, teams):
+        self.teams = list(teams)
+        self.seasons = 0
+        self.wins = {team: collections.Counter() for team in self.teams}
+        self.moments = {team: RunningMoments() for team in self.teams}
+        self.counts = {team: dict.fromkeys(self.outcomes, 0)\
+                       for team in self.teams}
+
+    def add(self, wins, reached):
+        ''' Add a season from each team's wins and the outcomes it reached
+'''
+        self.seasons += 1
+        for team in self.teams:
+            self.wins[team][wins[team]] += 1
+            self.moments[team].add(wins[team])
+            for outcome in reached[team]:
+                self.counts[team][outcome] += 1
+
+    def merge(self, other):
+        assert self.teams == other.teams
+        self.seasons += other.seasons
+        for team in self.teams:
+            self.wins[team].update(other.wins[team])
+            self.moments[team].merge(other.moments[team])
+            for outcome in self.outcomes:
+                self.counts[team][outcome] += other.counts[team][outcome]
+        return self
+
+    def __len__(self):
+        return self.seasons
+
+    def odds(self, team, outcome):
+        return self.counts[team][outcome]/self.seasons\
+               if self.seasons else 0.0
+
+    def report(self):
+        ''' Projected standings and playoff odds as printable lines
+'''
+        lines = []
+        for division, teams in DIVISIONS.items():
+            lines.append(division.ljust(15)+'W'.rjust(7)+'sd'.rjust(6)\
+                         +''.join([o.rjust(10) for o in self.outcomes]))
+            for team in sorted(teams, key=lambda t: -self.moments[t].mean):
+                moments = self.moments[team]
+                lines.append(
+                    team.ljust(15)+f'{moments.mean:7.1f}'\
+                    +f'{moments.variance**0.5:6.1f}'\
+                    +''.join([f'{self.odds(team, o):10.1%}'\
+                              for o in self.outcomes]))
+            lines.append('')
+        return '\n'.join(lines)
+
+def playoffs(league, wins, rng=random):
+    ''' Play the 12-team postseason of a season with these wins per team
+
+In each league the three division winners are seeded 1-3 and the three
+best other teams 4-6, ties broken at random. Seeds 1 and 2 have a bye,
+3 hosts 6 and 4 hosts 5 in every game of a best-of-3 wild card series,
+and the better seed has home field in the best-of-5 division series and
+best-of-7 championship series. The pennant winners meet in a best-of-7
+World Series, home field going to the better record. Returns the
+SeasonStats.outcomes reached by each team.
+'''
+    rank = {team: (wins[team], rng.random()) for team in wins}
+    reached = {team: set() for team in wins}
+    pennants = []
+    for name in ('AL', 'NL'):
+        divisions = [teams for division, teams in DIVISIONS.items()\
+                     if division.startswith(name)]
+        winners = sorted([max(teams, key=rank.get) for teams in divisions],
+                         key=rank.get, reverse=True)
+        others = sorted([team for teams in divisions for team in teams\
+                         if team not in winners],
+                        key=rank.get, reverse=True)
+        seeds = winners+others[:3]
+        for team in winners:
+            reached[team].add('Division')
+        for team in seeds:
+            reached[team].add('Playoffs')
+        for team in seeds[:2]:
+            reached[team].add('Bye')
+        #Series are listed (visitor, host): the better seed hosts
+        wild_card = (league.playoff_series(seeds[5], seeds[2], 3, rng),
+                     league.playoff_series(seeds[4], seeds[3], 3, rng))
+        division_series = (
+            league.playoff_series(wild_card[1], seeds[0], 5, rng),
+            league.playoff_series(wild_card[0], seeds[1], 5, rng))
+        visitor, host = sorted(division_series, key=seeds.index,
+                               reverse=True)
+        pennant = league.playoff_series(visitor, host, 7, rng)
+        reached[pennant].add('Pennant')
+        pennants.append(pennant)
+    visitor, host = sorted(pennants, key=rank.get)
+    reached[league.playoff_series(visitor, host, 7, rng)].add('Title')
+    return reached
+
+#Seasons played per BatchSimulation.simulate call of a batch season run
+SEASON_BLOCK = 100
+
+def run_season_chunk(league, schedule, n, seed, mode='game'):
+    ''' Simulate n seasons of a League from one random stream
+
+In 'game' mode every game is played out by its Simulation; 'batch' mode
+plays the regular season of SEASON_BLOCK seasons at a time in one
+BatchSimulation of all the distinct games (teams and starters) of the
+schedule. The postseason is always played game by game. Returns the
+SeasonStats of the n seasons.
+'''
+    rng = random.Random(seed)
+    stats = SeasonStats(league.teams)
+    games = league.starters(schedule)
+    if mode == 'batch':
+        distinct = sorted(set(games))
+        batch = league.batch(distinct)
+        batch.rng = np.random.default_rng(seed)
+        position = {game: i for i, game in enumerate(distinct)}
+        pairing = np.array([position[game] for game in games])
+        #Which team each game of the season counts for if won by the
+        #away or home team
+        team_index = {team: i for i, team in enumerate(league.teams)}
+        away_team = np.zeros((len(games), len(league.teams)))
+        home_team = np.zeros((len(games), len(league.teams)))
+        for i, (away, home, _, _) in enumerate(games):
+            away_team[i, team_index[away]] = 1
+            home_team[i, team_index[home]] = 1
+    for start in range(0, n, SEASON_BLOCK):
+        block = min(SEASON_BLOCK, n-start)
+        if mode == 'batch':
+            results = batch.simulate(
+                len(games)*block, np.tile(pairing, block))
+            home_won = (results.home_score > results.away_score)\
+                       .reshape(block, len(games))
+            wins = (home_won@home_team+(~home_won)@away_team).astype(int)
+        for k in range(block):
+            if mode == 'batch':
+                season = dict(zip(league.teams, wins[k].tolist()))
+            else:
+                season = dict.fromkeys(league.teams, 0)
+                for game in games:
+                    simulation = league.simulation(*game)
+                    simulation.rng = rng
+                    season[simulation.simulate_game().winner] += 1
+            stats.add(season, playoffs(league, season, rng))
+    return stats
+
+def init_season_worker(settings):
+    worker_state['league'] = League(
+        settings['directory'], rotation=settings['rotation'],
+        rng=random.Random(settings['seed']))
+    worker_state['schedule'] = settings['schedule']
+
+def run_season_worker_chunk(task):
+    n, seed, mode = task
+    return run_season_chunk(
+        worker_state['league'], worker_state['schedule'], n, seed, mode)
+
+def simulate_seasons(seasons, *, mode='game', seed=None, workers=1,
+                     rotation=5, schedule=None, directory=''):
+    ''' Simulate full seasons of all 30 teams and their postseasons
+
+The League's lineups and rotations are drawn from the seed, and so is the
+schedule unless one of (away, home) games is given. The seasons are
+split into one chunk per worker like run_parallel, chunk i simulated
+from stream_seed(seed, i). Returns the merged SeasonStats.
+'''
+    assert mode in ('game', 'batch')
+    if seed is None:
+        seed = random.randrange(2**32)
+    if schedule is None:
+        schedule = season_schedule(random.Random(seed))
+    if workers <= 1:
+        league = League(directory, rotation=rotation, rng=random.Random(seed))
+        return run_season_chunk(
+            league, schedule, seasons, stream_seed(seed, 0), mode)
+    settings = {'directory': directory, 'rotation': rotation, 'seed': seed,
+                'schedule': schedule}
+    tasks = [(seasons//workers+(i < seasons%workers), stream_seed(seed, i),
+              mode) for i in range(workers)]
+    with concurrent.futures.ProcessPoolExecutor(
+        workers, initializer=init_season_worker,
+        initargs=(settings,)) as pool:
+        chunks = list(pool.map(run_season_worker_chunk, tasks))
+    stats = SeasonStats(chunks[0].teams)
+    for chunk in chunks:
+        stats.merge(chunk)
+    return stats
+
+class Instruments:
+    ''' Opt-in call counters and timers around the hot paths
+
+install wraps every entry of INSTRUMENTED in place with a timer, so with
+no Instruments installed the simulation runs the plain functions and
+pays nothing. Times are inclusive: plate_appearance includes the event
+resolver it calls. Only calls in the current process are counted, so
+run worker pools with one worker to see inside the workers' games.
+
+With profile_rep, the profile_rep-th game simulated is run under
+profiler, a cProfile.Profile unless another object with enable and
+disable methods (a sampling profiler adapter, say) is given.
+'''
+    def __init__(self, *, profile_rep=None, profiler=None):
+        self.counts = collections.Counter()
+        self.seconds = collections.Counter()
+        self.originals = []
+        self.profile_rep = profile_rep
+        self.profiler = profiler
+        self.started = None
+
+    def timed(self, name, function):
+        counts, seconds, clock = self.counts, self.seconds, time.perf_counter
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds[name] += clock()-started
+                counts[name] += 1
+        return wrapper
+
+    def profiled(self, function):
+        ''' Run the profile_rep-th call of simulate_game under the profiler
+'''
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if self.counts['simulate_game'] != self.profile_rep-1:
+                return function(*args, **kwargs)
+            if self.profiler is None:
+                self.profiler = cProfile.Profile()
+            self.profiler.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.profiler.disable()
+        return wrapper
+
+    def install(self):
+        assert not self.originals, 'Instruments already installed'
+        for owner, attribute, name in INSTRUMENTED:
+            function = vars(owner)[attribute]
+            self.originals.append((owner, attribute, function))
+            if attribute == 'simulate_game' and self.profile_rep:
+                function = self.profiled(function)
+            setattr(owner, attribute, self.timed(name, function))
+        self.started = time.perf_counter()
+        return self
+
+    def uninstall(self):
+        for owner, attribute, function in reversed(self.originals):
+            setattr(owner, attribute, function)
+        self.originals = []
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exc_info):
+        self.uninstall()
+
+    def count(self, name, n=1):
+        ''' Add to a counter that is not tied to a wrapped call
+'''
+        self.counts[name] += n
+
+    def dump_profile(self, path):
+        ''' Write the profiled rep's cProfile stats for pstats or snakeviz
+'''
+        assert self.profiler is not None, 'No rep was profiled'
+        self.profiler.dump_stats(path)
+
+    def report(self, *, top=20):
+        ''' Calls and time of every instrumented path, slowest first
+'''
+        elapsed = time.perf_counter()-self.started if self.started\
+                  else sum(self.seconds.values())
+        lines = [f'{"":<24}{"Calls":>12}{"Seconds":>10}'
+                 f'{"us/call":>10}{"Share":>8}']
+        for name in sorted(self.counts, key=lambda name: (
+            -self.seconds[name], name)):
+            calls, seconds = self.counts[name], self.seconds[name]
+            if name not in self.seconds:
+                lines.append(f'{name:<24}{calls:>12}')
+                continue
+            lines.append(
+                f'{name:<24}{calls:>12}{seconds:>10.3f}'
+                f'{seconds/calls*1e6:>10.2f}{seconds/elapsed:>8.1%}')
+        lines.append(f'{"Elapsed":<24}{"":>12}{elapsed:>10.3f}')
+        if self.profiler is not None\
+           and isinstance(self.profiler, cProfile.Profile):
+            stream = io.StringIO()
+            pstats.Stats(self.profiler, stream=stream).sort_stats(
+                'cumulative').print_stats(top)
+            lines.extend(['', f'Profile of rep {self.profile_rep}',
+                          stream.getvalue().rstrip()])
+        return '\n'.join(lines)
+
+#(owner, attribute, report name) of every call timed by Instruments
+INSTRUMENTED = (
+    (Teams, 'compile_rosters', 'roster load'),
+    (LeaderboardFile, 'build', 'roster cache build'),
+    (sys.modules[__name__], 'matchup_table', 'matchup table'),
+    (Simulation, 'simulate_game', 'simulate_game'),
+    (Simulation, 'plate_appearance', 'plate_appearance'),
+    (Simulation, 'draw_uniforms', 'draw_uniforms'),
+    (Simulation, 'advance_runners', 'advance_runners'),
+    (BatchSimulation, 'simulate', 'batch simulate'),
+    (MarkovSolver, 'solve', 'exact solve'),
+    (GameViewer, 'update', 'UI update'),
+    (ListSink, 'write', 'ListSink write'),
+    (TextSink, 'write', 'TextSink write'),
+    (JSONLSink, 'write', 'JSONLSink write'),
+    (BinarySink, 'write', 'BinarySink write'),
+    (BinarySink, 'flush', 'BinarySink flush'),
+    (LeaderboardFetcher, 'write_csv', 'leaderboard write'))
+
+#Seconds a fresh interpreter may take to import this module and load the
+#rosters of a matchup from the roster cache
+STARTUP_BUDGET = 0.05
+
+def measure_startup(away_team, home_team, directory=''):
+    ''' Time the import and roster load of a fresh interpreter
+
+Runs in a subprocess so nothing already imported here is counted.
+Returns (import seconds, roster load seconds).
+'''
+    code = (
+        'import time\n'
+        'started = time.perf_counter()\n'
+        'import mlbsimulator\n'
+        'imported = time.perf_counter()\n'
+        'teams = mlbsimulator.Teams(%r)\n'
+        'teams.away_team, teams.home_team = %r, %r\n'
+        'teams.compile_rosters()\n'
+        'print(imported-started, time.perf_counter()-imported)\n'
+        % (directory, away_team, home_team))
+    path = [os.path.dirname(os.path.abspath(__file__))]
+    if 'PYTHONPATH' in os.environ:
+        path.append(os.environ['PYTHONPATH'])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path))
+    output = subprocess.run(
+        [sys.executable, '-c', code], env=env, capture_output=True,
+        text=True, check=True).stdout
+    import_time, roster_time = [float(t) for t in output.split()]
+    return import_time, roster_time
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='MLB game simulator')
+    parser.add_argument('--away', help='away team (runs headless)')
+    parser.add_argument('--home', help='home team (runs headless)')
+    parser.add_argument('--reps', type=int, default=1)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes to spread the reps over')
+    parser.add_argument('--mode', choices=('game', 'batch', 'exact'),
+                        default='game',
+                        help="'batch' simulates all reps in lockstep, "
+                        "'exact' solves the game as a Markov chain")
+    parser.add_argument('--verbose', action='store_true',
+                        help='print the play-by-play')
+    parser.add_argument('--events', metavar='PATH',
+                        help='write the play-by-play events to a .jsonl '
+                        'file, or any other path as pickled blocks')
+    parser.add_argument('--series', type=int, choices=sorted(SERIES_HOSTS),
+                        default=1, help='play best-of-n series, --home '
+                        'having home field')
+    parser.add_argument('--rotation', type=int, default=5,
+                        help='starting pitchers rotated through a series '
+                        'or season')
+    parser.add_argument('--update', action='store_true',
+                        help='download every position leaderboard first')
+    parser.add_argument('--season', type=int,
+                        help='season of the leaderboards to download')
+    parser.add_argument('--max-age', type=float, default=24,
+                        help='hours before a downloaded leaderboard is '
+                        'refreshed by --update (0 to always refresh)')
+    parser.add_argument('--as-of', metavar='DATE',
+                        help='simulate with the leaderboards as they were '
+                        'on DATE (YYYY-MM-DD), rebuilt from the snapshots')
+    parser.add_argument('--startup', action='store_true',
+                        help='measure the import and roster load time of '
+                        'the --away and --home teams against the budget')
+    parser.add_argument('--seasons', type=int,
+                        help='simulate this many full seasons of every team '
+                        '(game or batch mode) and print playoff odds')
+    parser.add_argument('--schedule', metavar='PATH',
+                        help='CSV of Away and Home games to play instead of '
+                        'a generated schedule')
+    parser.add_argument('--box-score', action='store_true',
+                        help="print the players' stats per game "
+                        "(game mode only)")
+    parser.add_argument('--precision', type=float,
+                        help='instead of --reps, simulate until the away '
+                        'win probability is known to +/- PRECISION (e.g. '
+                        '0.005) at 95%% confidence')
+    parser.add_argument('--no-antithetic', action='store_true',
+                        help='do not pair antithetic games for --precision')
+    parser.add_argument('--no-control', action='store_true',
+                        help='do not correct --precision estimates with the '
+                        'exact expected runs')
+    parser.add_argument('--optimize', choices=('away', 'home'),
+                        help="search the team's batting orders for the most "
+                        "runs (exact, or --mode batch) and print the best")
+    parser.add_argument('--objective', choices=('runs', 'win'),
+                        default='runs',
+                        help='rank the --optimize orders by expected runs or '
+                        'win probability')
+    parser.add_argument('--checkpoint', metavar='PATH',
+                        help='save the stats to PATH as the --reps are '
+                        'played, and resume from it if it holds the same '
+                        'run (needs --seed)')
+    parser.add_argument('--replay', type=int, metavar='INDEX',
+                        help='print the play-by-play of game INDEX (from 0) '
+                        'of the --checkpoint run of --seed')
+    parser.add_argument('--block', type=int, default=CHECKPOINT_BLOCK,
+                        help='games per random stream of --checkpoint and '
+                        '--replay')
+    parser.add_argument('--instrument', action='store_true',
+                        help='count and time the hot paths and print a '
+                        'summary at the end of the run')
+    parser.add_argument('--profile-rep', type=int, metavar='N',
+                        help='run the N-th game under cProfile and add its '
+                        'profile to the --instrument summary')
+    parser.add_argument('--profile-output', metavar='PATH',
+                        help='write the --profile-rep stats to PATH')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not (args.instrument or args.profile_rep):
+        return run(args)
+    with Instruments(profile_rep=args.profile_rep) as instruments:
+        try:
+            return run(args)
+        finally:
+            if args.profile_output and instruments.profiler is not None:
+                instruments.dump_profile(args.profile_output)
+            print(instruments.report(), file=sys.stderr)
+
+def run(args):
+    directory = ''
+    if args.startup:
+        assert args.away and args.home
+        #Warm the roster cache so that only a normal start is measured
+        measure_startup(args.away, args.home)
+        import_time, roster_time = measure_startup(args.away, args.home)
+        total = import_time+roster_time
+        print(f'Import {import_time*1000:.1f} ms, rosters '
+              f'{roster_time*1000:.1f} ms: {total*1000:.1f} ms of '
+              f'{STARTUP_BUDGET*1000:.0f} ms budget'
+              +('' if total <= STARTUP_BUDGET else ' EXCEEDED'))
+        return total <= STARTUP_BUDGET
+    if args.update:
+        refresher = RefreshManager(
+            max_age=args.max_age*60*60,
+            fetcher=LeaderboardFetcher(season=args.season))
+        stale = refresher.refresh()
+        refresher.fetcher.wait()
+        refresher.fetcher.close()
+        for pos in stale:
+            error = refresher.fetcher.errors.get(pos)
+            print(f"'{pos}.csv' " + (f'not updated: {error}' if error\
+                                     else 'updated'))
+        if not (args.seasons or args.away and args.home):
+            return refresher
+    if args.as_of:
+        directory = RefreshManager().restore(args.as_of)
+    if args.seasons:
+        schedule = load_schedule(args.schedule) if args.schedule else None
+        stats = simulate_seasons(
+            args.seasons, mode=args.mode, seed=args.seed,
+            workers=args.workers, rotation=args.rotation, schedule=schedule,
+            directory=directory)
+        print(stats.report())
+        return stats
+    if args.optimize:
+        assert args.away and args.home
+        simulation = setup_simulation(
+            args.away, args.home, rng=random.Random(args.seed),
+            directory=directory)
+        optimizer = BattingOrderOptimizer(
+            simulation, away=args.optimize == 'away',
+            mode='batch' if args.mode == 'batch' else 'exact',
+            objective=args.objective, workers=args.workers, seed=args.seed,
+            directory=directory)
+        results = optimizer.optimize()
+        for rank, result in enumerate(results, 1):
+            print(f'{rank}. {result.runs:.3f} runs, {result.p_win:.2%} '
+                  f'wins: {", ".join(result.lineup.values())}')
+        return results
+    if args.away and args.home and args.precision:
+        seed = args.seed if args.seed is not None\
+               else random.randrange(2**32)
+        simulation = setup_simulation(
+            args.away, args.home, rng=random.Random(seed),
+            directory=directory)
+        result = simulate_to_precision(
+            simulation, args.precision,
+            mode='batch' if args.mode == 'batch' else 'game',
+            seed=stream_seed(seed, 0), antithetic=not args.no_antithetic,
+            control=not args.no_control)
+        print(result.report())
+        return result
+    if args.away and args.home and args.replay is not None:
+        assert args.seed is not None
+        sink = open_sink(args.events) if args.events else TextSink()
+        simulation = setup_simulation(
+            args.away, args.home, rng=random.Random(args.seed),
+            directory=directory, sink=sink, box_score=args.box_score)
+        try:
+            result = replay_game(
+                simulation, args.seed, args.replay, block=args.block)
+        finally:
+            sink.close()
+        print(result)
+        if simulation.box_score is not None:
+            print()
+            print(simulation.box_score.report())
+        return result
+    if args.away and args.home and args.checkpoint:
+        assert args.seed is not None and args.mode in ('game', 'batch')
+        simulation = setup_simulation(
+            args.away, args.home, rng=random.Random(args.seed),
+            directory=directory, box_score=args.box_score)
+        results = run_checkpointed(
+            simulation, args.reps, args.seed, args.checkpoint,
+            mode=args.mode, block=args.block, workers=args.workers,
+            directory=directory)
+        print(results.report())
+        if results.box_score is not None:
+            print()
+            print(results.box_score.report())
+        return results
+    if args.away and args.home and args.series > 1:
+        results = simulate(
+            args.away, args.home, args.reps, mode=args.mode,
+            seed=args.seed, series=args.series, rotation=args.rotation,
+            directory=directory)
+        records = results if args.mode == 'exact'\
+                  else series_records(results)
+        print(series_report(args.away, args.home, records))
+        return results
+    if args.away and args.home:
+        if args.events:
+            sink = open_sink(args.events)
+        elif args.verbose:
+            sink = TextSink()
+        else:
+            sink = None
+        try:
+            results = simulate(
+                args.away, args.home, args.reps, mode=args.mode,
+                seed=args.seed, workers=args.workers,
+                summary=args.mode != 'exact', box_score=args.box_score,
+                sink=sink, directory=directory)
+        finally:
+            if sink is not None:
+                sink.close()
+        if args.mode == 'exact':
+            print(f'{args.away}: {results.p_away_win:.2%} '
+                  f'({results.away_expected:.2f} runs)')
+            print(f'{args.home}: {results.p_home_win:.2%} '
+                  f'({results.home_expected:.2f} runs)')
+            return results
+        print(results.report())
+        if results.box_score is not None:
+            print()
+            print(results.box_score.report())
+        return results
+
+    teams = Teams()
+
+    configure_simulation = ConfigureSimulationGUI(teams.teams)
+    configure_simulation.display()
+    teams.away_team = configure_simulation.away_team
+    teams.home_team = configure_simulation.home_team
+    teams.compile_rosters()
+
+    configure_lineups = ConfigureLineupsGUI(
+        teams.teams,
+        teams.away_team, teams.home_team,
+        teams.away_roster, teams.home_roster,
+        teams.away_depth_chart, teams.home_depth_chart)
+    configure_lineups.display()
+
+    away_starters = [configure_lineups.away_starters[pos]['Variable'].get()\
+                     for pos in configure_lineups.away_starters]
+    home_starters = [configure_lineups.home_starters[pos]['Variable'].get()\
+                     for pos in configure_lineups.home_starters]
+    away_lineup = dict(zip(
+        list(configure_lineups.away_batting_order),
+        [configure_lineups.away_starters[
+            configure_lineups.away_batting_order[i]['Variable'].get()
+            ]['Variable'].get()\
+         for i in list(configure_lineups.away_batting_order)]
+        ))
+    home_lineup = dict(zip(
+        list(configure_lineups.home_batting_order),
+        [configure_lineups.home_starters[
+            configure_lineups.home_batting_order[i]['Variable'].get()
+            ]['Variable'].get()\
+         for i in list(configure_lineups.home_batting_order)]
+        ))
+
+    away_starting_pitcher = configure_lineups.away_pitchers['Variable'].get()
+    home_starting_pitcher = configure_lineups.home_pitchers['Variable'].get()
+
+    precision = configure_lineups.precision['Variable'].get().strip()
+    if precision:
+        simulation = Simulation(
+            configure_lineups.away_team, configure_lineups.home_team,
+            configure_lineups.away_roster, configure_lineups.home_roster,
+            away_lineup, home_lineup,
+            away_starting_pitcher, home_starting_pitcher)
+        result = simulate_to_precision(
+            simulation, float(precision)/100,
+            mode='game' if np is None else 'batch')
+        print(result.report())
+        return result
+
+    #A single game is a one-game series started by the selected pitchers
+    series = configure_simulation.series
+    away_rotation = sp_rotation(
+        configure_lineups.away_depth_chart, first=away_starting_pitcher)
+    home_rotation = sp_rotation(
+        configure_lineups.home_depth_chart, first=home_starting_pitcher)
+
+    i = 0
+    reps = int(configure_lineups.reps['Variable'].get())
+    stats = GameStats(configure_lineups.away_team, configure_lineups.home_team)
+    series_results = []
+    viewer = GameViewer(auto_advance=reps > 1)
+    while i < reps and not viewer.closed:
+        results = []
+        for game, hosted in enumerate(SERIES_HOSTS[series]):
+            away_sp = away_rotation[game%len(away_rotation)]
+            home_sp = home_rotation[game%len(home_rotation)]
+            if hosted:
+                game_result = viewer.play(
+                    configure_lineups.away_team, configure_lineups.home_team,
+                    configure_lineups.away_roster,
+                    configure_lineups.home_roster,
+                    away_lineup, home_lineup, away_sp, home_sp)
+            else:
+                game_result = viewer.play(
+                    configure_lineups.home_team, configure_lineups.away_team,
+                    configure_lineups.home_roster,
+                    configure_lineups.away_roster,
+                    home_lineup, away_lineup, home_sp, away_sp)
+            #The window was closed before the game ended
+            if game_result is None:
+                break
+            results.append(game_result)
+            result = SeriesResult(
+                configure_lineups.away_team, configure_lineups.home_team,
+                series, results)
+            if max(result.away_wins, result.home_wins) > series//2:
+                break
+        if series == 1:
+            for result in results:
+                stats.add(result)
+        elif results and max(result.away_wins, result.home_wins) > series//2:
+            series_results.append(result)
+            print(result)
+        i += 1
+    viewer.close()
+    if stats.games:
+        print(stats.report())
+    if series_results:
+        print(series_report(
+            configure_lineups.away_team, configure_lineups.home_team,
+            series_records(series_results)))
 
 if __name__ == '__main__':
     main()
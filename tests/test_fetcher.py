@@ -0,0 +1,110 @@
+import csv
+import http.server
+import importlib.util
+import os
+import tempfile
+import threading
+import unittest
+
+import mlbsimulator
+
+PAGE = '''<html><body>
+<table class="rgMasterTable">
+<thead><tr>
+<th class="rgHeader">#</th><th class="rgHeader">Name</th>
+<th class="rgHeader">Team</th><th class="rgHeader">PA</th>
+</tr></thead>
+<tbody>
+<tr><td>1</td>
+<td><a href="statss.aspx?playerid=101&position=C">Player One</a></td>
+<td>Angels</td><td>500</td></tr>
+<tr><td>2</td>
+<td><a href="statss.aspx?playerid=102&position=C">Player Two</a></td>
+<td>Astros</td><td>250</td></tr>
+</tbody>
+</table>
+</body></html>'''
+
+class LeaderboardHandler(http.server.BaseHTTPRequestHandler):
+    ''' Serves PAGE, or fails with status if the server has one set
+'''
+    def do_GET(self):
+        status = self.server.status
+        body = PAGE.encode() if status == 200 else b'Server error'
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@unittest.skipUnless(importlib.util.find_spec('bs4')
+                     and importlib.util.find_spec('requests'),
+                     'needs bs4 and requests')
+class LeaderboardFetcherTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(
+            ('127.0.0.1', 0), LeaderboardHandler)
+        self.server.status = 200
+        threading.Thread(
+            target=self.server.serve_forever, daemon=True).start()
+        self.directory = tempfile.TemporaryDirectory()
+        self.fetcher = mlbsimulator.LeaderboardFetcher(
+            self.directory.name,
+            url=f'http://127.0.0.1:{self.server.server_port}/leaders.aspx',
+            timeout=5)
+
+    def tearDown(self):
+        self.fetcher.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def test_fetch_writes_csv(self):
+        finished = []
+        events = self.fetcher.fetch(
+            ['C', 'SP'], callback=lambda pos, error: finished.append(
+                (pos, error)))
+        self.assertTrue(self.fetcher.wait(timeout=10))
+        self.assertTrue(all([event.is_set() for event in events]))
+        self.assertEqual(sorted(finished), [('C', None), ('SP', None)])
+        self.assertEqual(self.fetcher.errors, {})
+        for pos in ('C', 'SP'):
+            path = os.path.join(self.directory.name, f'{pos}.csv')
+            with open(path, newline='', encoding='utf-8') as file:
+                rows = list(csv.reader(file))
+            self.assertEqual(rows, [
+                ['Name', 'Team', 'PA', 'playerid'],
+                ['Player One', 'Angels', '500', '101'],
+                ['Player Two', 'Astros', '250', '102']])
+        self.assertEqual(sorted(os.listdir(self.directory.name)),
+                         ['C.csv', 'SP.csv'])
+
+    def test_server_error(self):
+        self.server.status = 500
+        finished = []
+        events = self.fetcher.fetch(
+            ['C'], callback=lambda pos, error: finished.append(
+                (pos, error)))
+        self.assertTrue(self.fetcher.wait(timeout=10))
+        self.assertTrue(events[0].is_set())
+        self.assertFalse(self.fetcher.busy())
+        self.assertEqual([pos for pos, error in finished], ['C'])
+        self.assertIsNotNone(finished[0][1])
+        self.assertIn('500', str(self.fetcher.errors['C']))
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_fetch_after_close(self):
+        self.fetcher.fetch(['C'])
+        self.assertTrue(self.fetcher.wait(timeout=10))
+        self.fetcher.close()
+        self.fetcher.fetch(['RP'])
+        self.assertTrue(self.fetcher.wait(timeout=10))
+        self.assertEqual(self.fetcher.errors, {})
+        self.assertTrue(os.path.exists(
+            os.path.join(self.directory.name, 'RP.csv')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import random
+import tempfile
+import unittest
+
+import benchmark
+import mlbsimulator
+
+@unittest.skipUnless(mlbsimulator.np is not None, 'needs NumPy')
+class BattingOrderOptimizerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        benchmark.write_fixtures(cls.directory.name)
+        cls.simulation = mlbsimulator.setup_simulation(
+            'Angels', 'Astros', rng=random.Random(0),
+            directory=cls.directory.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def nine_inning_runs(self, lineup):
+        ''' Exact nine-inning runs of the away team batting lineup
+'''
+        spots = {player: spot for spot, player\
+                 in self.simulation.away_lineup.items()}
+        order = [spots[lineup[spot]] for spot in range(1, 10)]
+        return mlbsimulator.nine_inning_runs(mlbsimulator.reorder_lineup(
+            self.simulation.away_matchups, order))
+
+    def test_optimize(self):
+        k = 3
+        optimizer = mlbsimulator.BattingOrderOptimizer(
+            self.simulation, restarts=1, seed=0)
+        results = optimizer.optimize(top=k)
+        self.assertEqual(len(results), k)
+        starters = sorted(self.simulation.away_lineup.values())
+        orders = set()
+        for result in results:
+            self.assertEqual(result.team, 'Angels')
+            self.assertEqual(sorted(result.lineup), list(range(1, 10)))
+            self.assertEqual(sorted(result.lineup.values()), starters)
+            orders.add(tuple(result.lineup.values()))
+        self.assertEqual(len(orders), k)
+        runs = [result.runs for result in results]
+        self.assertEqual(runs, sorted(runs, reverse=True))
+        self.assertGreaterEqual(
+            self.nine_inning_runs(results[0].lineup),
+            self.nine_inning_runs(self.simulation.away_lineup))
+
+    def test_stop(self):
+        optimizer = mlbsimulator.BattingOrderOptimizer(
+            self.simulation, restarts=1, seed=0)
+        optimizer.stop()
+        results = optimizer.optimize(top=1)
+        self.assertEqual(optimizer.steps, 1)
+        self.assertEqual(len(results), 1)
+
+if __name__ == '__main__':
+    unittest.main()